@@ -0,0 +1,166 @@
+"""
+Fills the template from many raw files in one go, e.g. to backfill a quarter of daily reports.
+
+    python batch.py "raw/*.xlsx" -o filled/ --jobs 4
+    python batch.py raw/ -o filled/
+
+The template is parsed once and shared with a bounded pool of worker processes. Every raw file gets its
+own output, named from the "As on" date inside it, and a failing file is reported without stopping the rest.
+"""
+import argparse
+import glob
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import openpyxl
+
+from config import template_file, SHEETS_TO_IGNORE, LOGO_FILENAME, BATCH_OUTPUT_NAME, HISTORY_DB
+from helper import HeaderScan, parse_date
+from main import main
+from schema import MAPPING_FILE_ENV, current_schema
+from template_cache import get_prepared_template, share_prepared_template
+
+_FILENAME_DATE = re.compile(r"\d{1,4}[ .-](?:\d{1,2}|[A-Za-z]{3})[ .-]\d{2,4}")
+
+
+def raw_file_date(raw_file, sheets_to_ignore=SHEETS_TO_IGNORE):
+    """
+    Report date of a raw file: its "As on ..." cell, else a date in the file name, else the file's mtime.
+    An unreadable file still gets a date here; it fails (and is reported) when it is processed.
+    """
+    try:
+        workbook = openpyxl.load_workbook(raw_file, read_only=True)
+    except Exception:
+        workbook = None
+    try:
+        for sheet in workbook.worksheets if workbook else ():
+            if sheet.title in sheets_to_ignore:
+                continue
+            if found := HeaderScan(enumerate(sheet.iter_rows(values_only=True), 1)).as_on_date:
+                return found
+            break
+    finally:
+        if workbook:
+            workbook.close()
+    if (match := _FILENAME_DATE.search(os.path.basename(raw_file))) and (found := parse_date(match.group())):
+        return found
+    return datetime.fromtimestamp(os.path.getmtime(raw_file)).date()
+
+
+def collect_raw_files(patterns):
+    """Raw .xlsx files from a mix of glob patterns and directories, in a stable order without duplicates."""
+    raw_files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.xlsx"))
+        else:
+            matches = glob.glob(pattern)
+        raw_files.extend(sorted(path for path in matches if not os.path.basename(path).startswith("~$")))
+    return list(dict.fromkeys(os.path.abspath(path) for path in raw_files))
+
+
+def plan_outputs(by_date, output_dir):
+    """
+    Output path for every raw file from its report date ({raw file: date}); raw files of the same date get
+    the raw file name as a suffix.
+    """
+    taken = {}
+    for raw, day in by_date.items():
+        taken.setdefault(day, []).append(raw)
+    outputs = {}
+    for raw, day in by_date.items():
+        name = BATCH_OUTPUT_NAME.format(date=day)
+        if len(taken[day]) > 1:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem} ({os.path.splitext(os.path.basename(raw))[0]}){ext}"
+        outputs[raw] = os.path.join(output_dir, name)
+    return outputs
+
+
+def _init_worker(prepared, log_level):
+    logging.basicConfig(level=log_level, format="%(message)s")
+    share_prepared_template(prepared)
+
+
+def process_one(raw_file, output_file, writer="openpyxl", as_on=None, history_db=None):
+    """Runs the pipeline on one raw file; returns (seconds, error message or None)."""
+    start = time.perf_counter()
+    try:
+        main(raw_file, output_file, SHEETS_TO_IGNORE, LOGO_FILENAME, writer=writer, as_on=as_on, history_db=history_db)
+    except (Exception, SystemExit) as e:
+        return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return time.perf_counter() - start, None
+
+
+def run_batch(raw_files, output_dir, jobs=1, writer="openpyxl", history_db=None):
+    """
+    Processes raw_files with at most jobs worker processes and returns one result per file,
+    {'raw_file', 'output_file', 'seconds', 'error'}, in the order of raw_files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # The date that names each output is also the one written into it
+    by_date = {raw: raw_file_date(raw) for raw in raw_files}
+    outputs = plan_outputs(by_date, output_dir)
+    prepared = get_prepared_template(template_file, SHEETS_TO_IGNORE)
+    results = {}
+
+    def record(raw, seconds, error):
+        results[raw] = {'raw_file': raw, 'output_file': outputs[raw], 'seconds': round(seconds, 3), 'error': error}
+        outcome = f"FAILED: {error}" if error else f"-> {os.path.basename(outputs[raw])}"
+        print(f"{seconds:7.2f}s  {os.path.basename(raw)} {outcome}", flush=True)
+
+    if jobs <= 1:
+        for raw in raw_files:
+            record(raw, *process_one(raw, outputs[raw], writer, by_date[raw], history_db))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(prepared, logging.getLogger().level)) as pool:
+            futures = {pool.submit(process_one, raw, outputs[raw], writer, by_date[raw], history_db): raw
+                       for raw in raw_files}
+            for future in as_completed(futures):
+                try:
+                    seconds, error = future.result()
+                except Exception as e:  # the worker itself died
+                    seconds, error = 0.0, f"{type(e).__name__}: {e}"
+                record(futures[future], seconds, error)
+    return [results[raw] for raw in raw_files]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fill the Daily Performance template from many raw Excel files.")
+    parser.add_argument("inputs", nargs="+", help="raw files, glob patterns or directories of raw .xlsx files")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory for the filled reports (default: .)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="raw files processed at the same time (default: number of CPUs)")
+    parser.add_argument("--writer", choices=("openpyxl", "patch"), default="openpyxl",
+                        help="output writer, see cli.py (default: openpyxl)")
+    parser.add_argument("--history", nargs="?", const=HISTORY_DB, metavar="DB",
+                        help=f"also store every report's values in a SQLite history database (default: {HISTORY_DB})")
+    parser.add_argument("--mapping", metavar="PATH",
+                        help="JSON or YAML column mapping to use instead of the one in config.py, see schema.py")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log the pipeline's progress for every file")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    if args.mapping:
+        os.environ[MAPPING_FILE_ENV] = args.mapping  # inherited by the worker processes
+        current_schema()
+    raw_files = collect_raw_files(args.inputs)
+    if not raw_files:
+        sys.exit(f"No raw .xlsx files found in {', '.join(args.inputs)}")
+
+    start = time.perf_counter()
+    results = run_batch(raw_files, args.output_dir, min(args.jobs, len(raw_files)), args.writer, args.history)
+    failed = [result for result in results if result['error']]
+    print(f"{len(results) - len(failed)} of {len(results)} files filled in {time.perf_counter() - start:.1f}s")
+    for result in failed:
+        print(f"  failed: {result['raw_file']}: {result['error']}")
+    sys.exit(1 if failed else 0)
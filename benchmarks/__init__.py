@@ -0,0 +1,4 @@
+"""
+Performance benchmarks: synthetic raw/template workbooks (synthetic.py) and a stage timer for the
+main() pipeline (run.py). Run from the repository root with ``python -m benchmarks.run``.
+"""
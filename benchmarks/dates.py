@@ -0,0 +1,92 @@
+"""
+Compares helper.is_date_like with the strptime loop it replaced, on header-band values like the ones
+the resolver classifies (plain headers, dates in the supported styles, month IDs, blanks).
+
+    python -m benchmarks.dates --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from config import RAW_TO_TEMPLATE_HEADER_MAP, RATING_HEADERS  # noqa: E402
+from helper import is_date_like, _parse_date_string  # noqa: E402
+
+
+def legacy_is_date_like(v):
+    """is_date_like as it was before the cache and the shape pre-check."""
+    if v is None: return None
+    if isinstance(v, datetime): return v
+    if isinstance(v, str):
+        for fmt in ("%d-%b-%Y", "%d-%b-%y", "%d-%b-%Y ", "%d-%m-%Y", "%Y-%m-%d"):
+            try:
+                return datetime.strptime(v.strip(), fmt)
+            except Exception:
+                continue
+    return None
+
+
+def header_band_values(count, seed=7):
+    """Values shaped like a raw header band: mostly text headers, some dates and month IDs."""
+    rng = random.Random(seed)
+    headers = list(RAW_TO_TEMPLATE_HEADER_MAP) + RATING_HEADERS + ["Historical Expense Ratio", "Performance (%)",
+                                                                   "Annualised", "Corpus", " ", "-"]
+    start = datetime(2024, 1, 1)
+    date_styles = ("%d-%b-%Y", "%d-%b-%y", "%d-%m-%Y", "%Y-%m-%d")
+    values = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            values.append(rng.choice(headers))
+        elif kind < 0.9:
+            values.append((start + timedelta(days=rng.randrange(600))).strftime(rng.choice(date_styles)))
+        elif kind < 0.95:
+            values.append(rng.choice((202507, 202508, 202506)))
+        else:
+            values.append(None)
+    return values
+
+
+def uncached_is_date_like(v):
+    """is_date_like without the cache, to measure the shape pre-check on its own."""
+    if isinstance(v, str):
+        return _parse_date_string.__wrapped__(v.strip())
+    return is_date_like(v)
+
+
+def _time(function, values, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for value in values:
+            function(value)
+    return time.perf_counter() - start
+
+
+def run(count=5000, repeat=10):
+    values = header_band_values(count)
+    mismatches = [v for v in values if is_date_like(v) != legacy_is_date_like(v)]
+    legacy = _time(legacy_is_date_like, values, repeat)
+    uncached = _time(uncached_is_date_like, values, repeat)
+    cached = _time(is_date_like, values, repeat)
+    calls = count * repeat
+    return {'values': count, 'repeat': repeat, 'mismatches': len(mismatches),
+            'legacy_us_per_call': round(legacy / calls * 1e6, 3),
+            'uncached_us_per_call': round(uncached / calls * 1e6, 3),
+            'cached_us_per_call': round(cached / calls * 1e6, 3),
+            'speedup_uncached': round(legacy / uncached, 1),
+            'speedup_cached': round(legacy / cached, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--values", type=int, default=5000, help="header values per pass (default: 5000)")
+    parser.add_argument("--repeat", type=int, default=10, help="passes over the values (default: 10)")
+    args = parser.parse_args()
+    for key, value in run(args.values, args.repeat).items():
+        print(f"{key:>20}: {value}")
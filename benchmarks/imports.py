@@ -0,0 +1,56 @@
+"""
+Measures the import time of the pipeline's entry modules with `python -X importtime`, each in a fresh
+interpreter, and lists the heaviest imports below them.
+
+    python -m benchmarks.imports --repeat 5 main batch
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["main", "cli", "batch", "jobs", "streamlit"]
+
+
+def import_times(statement):
+    """[(imported module, cumulative microseconds, nesting depth)] of running statement in a fresh interpreter."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times.append((name.strip(), int(cumulative), (len(name) - len(name.lstrip()) - 1) // 2))
+    return times
+
+
+def run(modules=MODULES, repeat=5, top=5):
+    # Modules the interpreter imports at start-up, before the statement runs
+    startup = {name for name, _, _ in import_times("pass")}
+    results = {}
+    for module in modules:
+        runs = ([entry for entry in import_times(f"import {module}") if entry[0] not in startup]
+                for _ in range(repeat))
+        best = min(runs, key=lambda times: times[-1][1])
+        # Direct imports of the module, heaviest first
+        children = sorted(((us, name) for name, us, depth in best if depth == 1), reverse=True)
+        results[module] = {'ms': round(best[-1][1] / 1000, 1),
+                           'imports_streamlit': module != "streamlit" and any(name == "streamlit" for name, _, _ in best),
+                           'heaviest': {name: round(us / 1000, 1) for us, name in children[:top]}}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=MODULES, help=f"modules to import (default: {' '.join(MODULES)})")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module, best kept (default: 5)")
+    parser.add_argument("--top", type=int, default=5, help="heaviest direct imports listed (default: 5)")
+    args = parser.parse_args()
+    for module, result in run(args.modules, args.repeat, args.top).items():
+        flag = "  (imports streamlit)" if result['imports_streamlit'] else ""
+        print(f"{module:>10}: {result['ms']:8.1f} ms{flag}")
+        for name, ms in result['heaviest'].items():
+            print(f"{'':>12}{name:<28}{ms:8.1f} ms")
@@ -0,0 +1,126 @@
+"""
+Times each stage of the main() pipeline on synthetic workbooks and writes the results to JSON.
+
+    python -m benchmarks.run --sheets 15 --rows 30
+    python -m benchmarks.run --scale --output scale_results.json
+
+Results go to benchmarks/benchmark_results.json unless --output says otherwise.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import openpyxl
+
+from benchmarks.synthetic import generate_raw_workbook, generate_template_workbook
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from config import SHEETS_TO_IGNORE, LOGO_FILENAME  # noqa: E402
+from main import process_sheet, create_styled_homepage  # noqa: E402
+from template_cache import PreparedTemplate  # noqa: E402
+from resolve import resolve_raw_sheets  # noqa: E402
+
+RESULTS_FILE = os.path.join(REPO_ROOT, "benchmarks", "benchmark_results.json")
+
+# (sheets, rows per sheet) from today's daily files up to the largest size we plan for
+SCALING_SIZES = [(15, 30), (15, 200), (25, 1000), (50, 2000), (50, 5000)]
+
+
+@contextlib.contextmanager
+def _timed(timings, stage):
+    start = time.perf_counter()
+    yield
+    timings[stage] = round(time.perf_counter() - start, 4)
+
+
+def run_pipeline(raw_path, template_path, output_path, workers=1):
+    """
+    Runs the same stages as main(), returning {stage: seconds}. Pipeline output is silenced.
+    'parse_template' is the cold parse that get_prepared_template does once per process, so it is left
+    out of 'load' and 'total', which are what every later run pays; 'copy_template' is that run's
+    private copy of the parsed template.
+    """
+    timings = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        with _timed(timings, 'parse_template'):
+            prepared = PreparedTemplate(template_path, SHEETS_TO_IGNORE)
+            layouts = prepared.layouts
+        with _timed(timings, 'copy_template'):
+            template_wb = prepared.workbook()
+        with _timed(timings, 'load_raw'):
+            resolved_sheets = resolve_raw_sheets(raw_path, layouts, SHEETS_TO_IGNORE, workers)
+        with _timed(timings, 'process_sheet'):
+            process_sheet(resolved_sheets, template_wb, SHEETS_TO_IGNORE, layouts)
+        with _timed(timings, 'create_styled_homepage'):
+            create_styled_homepage(template_wb, SHEETS_TO_IGNORE, os.path.join(REPO_ROOT, LOGO_FILENAME))
+        with _timed(timings, 'save'):
+            template_wb.save(output_path)
+    timings['load'] = round(timings['copy_template'] + timings['load_raw'], 4)
+    timings['total'] = round(sum(timings[s] for s in ('load', 'process_sheet', 'create_styled_homepage', 'save')), 4)
+    return timings
+
+
+def benchmark_size(work_dir, sheets, rows, columns, merged, repeat=1, workers=1):
+    raw_path = os.path.join(work_dir, f"raw_{sheets}x{rows}.xlsx")
+    template_path = os.path.join(work_dir, f"template_{sheets}.xlsx")
+    output_path = os.path.join(work_dir, f"output_{sheets}x{rows}.xlsx")
+    generate_raw_workbook(raw_path, sheet_count=sheets, rows_per_sheet=rows, column_count=columns,
+                          merged_range_count=merged)
+    generate_template_workbook(template_path, sheet_count=sheets)
+    runs = [run_pipeline(raw_path, template_path, output_path, workers) for _ in range(repeat)]
+    # Best of the repeats per stage, the least noisy figure for spotting regressions
+    best = {stage: min(run[stage] for run in runs) for stage in runs[0]}
+    return {'sheets': sheets, 'rows_per_sheet': rows, 'columns': columns, 'merged_ranges': merged,
+            'workers': workers, 'raw_file_bytes': os.path.getsize(raw_path), 'repeat': repeat,
+            'stages': best, 'runs': runs}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the Daily Performance pipeline on synthetic workbooks.")
+    parser.add_argument("--sheets", type=int, default=15)
+    parser.add_argument("--rows", type=int, default=30, help="data rows per sheet")
+    parser.add_argument("--columns", type=int, default=60, help="columns in the raw sheets")
+    parser.add_argument("--merged", type=int, default=21, help="merged ranges per raw sheet")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--scale", action="store_true",
+                        help=f"run every size in {SCALING_SIZES} (sheets, rows) instead of --sheets/--rows")
+    parser.add_argument("--output", default=RESULTS_FILE,
+                        help="JSON results file (default: benchmarks/benchmark_results.json)")
+    parser.add_argument("--keep-files", metavar="DIR", help="write the generated workbooks to DIR and keep them")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = SCALING_SIZES if args.scale else [(args.sheets, args.rows)]
+    work_dir_ctx = contextlib.nullcontext(args.keep_files) if args.keep_files else tempfile.TemporaryDirectory()
+    results = []
+    with work_dir_ctx as work_dir:
+        os.makedirs(work_dir, exist_ok=True)
+        for sheets, rows in sizes:
+            result = benchmark_size(work_dir, sheets, rows, args.columns, args.merged, args.repeat, args.workers)
+            print(f"{sheets:>3} sheets x {rows:>5} rows: " +
+                  ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result['stages'].items()))
+            results.append(result)
+
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+              'openpyxl': openpyxl.__version__, 'platform': platform.platform(), 'results': results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Generates synthetic raw and template workbooks with the layout the pipeline expects: a "Scheme Name"
+header row, 6-digit month-ID banners merged over each month group, dated AUM and expense ratio columns
+and a Benchmark table below the template data.
+"""
+import random
+from datetime import datetime, timedelta
+
+import openpyxl
+from openpyxl.utils import get_column_letter
+
+LATEST_MONTH_ID, OLDER_MONTH_ID = 202508, 202507
+LATEST_DATE, OLDER_DATE = datetime(2025, 8, 31), datetime(2025, 7, 31)
+
+QUANT_HEADERS = ["Average Maturity Years", "Modified Duration Years", "YTM (%)"]
+PERFORMANCE_HEADERS = ["Latest Date", "Latest NAV(Rs)", "1 Day", "3 Day", "1 Week", "2 Week", "1 Month", "3 Months",
+                       "6 Months", "9 Months", "1 Year", "3 Years", "5 Years", "10 Years", "SINCE INCEPTION"]
+RATING_BLOCK = ["A / A+ / A-", "A1 / A1+ / A1-", "AA / AA+ / AA-", "AAA", "Cash & Equivalent", "Others", "SOV",
+                "Unrated"]
+DETAIL_HEADERS = ["Exit Load", "Remark", "Inception Date", "[Fund Manager 1]"]
+TEMPLATE_DETAIL_HEADERS = ["Exit Load", "Remark", "Inception Date", "Fund Manager"]
+
+RAW_HEADER_ROW = 12
+TEMPLATE_HEADER_ROW = 7
+# Banner merges the raw layout always has (group labels and the two month-ID banners per group)
+BASE_MERGED_RANGES = 9
+
+
+def sheet_names(sheet_count):
+    return [f"Fund Category {i:02d}" for i in range(1, sheet_count + 1)]
+
+
+def raw_layout(column_count):
+    """
+    Raw header row (list of headers, None for the dated columns) and the first column of every block.
+    Unmapped filler columns are inserted before the scheme details to reach column_count.
+    """
+    headers = ["Scheme Name", OLDER_DATE, LATEST_DATE] + QUANT_HEADERS * 2 + [OLDER_DATE, LATEST_DATE]
+    blocks = {'quants': 4, 'expense': 10, 'performance': len(headers) + 1}
+    headers += PERFORMANCE_HEADERS
+    blocks['rating'] = len(headers) + 1
+    headers += RATING_BLOCK * 2
+    filler = max(0, column_count - len(headers) - len(DETAIL_HEADERS))
+    headers += [f"Extra Metric {i}" for i in range(1, filler + 1)]
+    blocks['details'] = len(headers) + 1
+    headers += DETAIL_HEADERS
+    return headers, blocks
+
+
+def _banner_rows(headers, blocks, merged_range_count):
+    """Rows 1..11 of the raw header band plus the merged ranges over them."""
+    width = len(headers)
+    rows = [[None] * width for _ in range(RAW_HEADER_ROW - 1)]
+    rows[1][0] = "Home"
+    rows[2][0] = f"As on {LATEST_DATE.strftime('%Y-%b-%d')}"
+    merged = []
+
+    def banner(row, first_col, last_col, value):
+        rows[row - 1][first_col - 1] = value
+        if last_col > first_col:
+            merged.append(f"{get_column_letter(first_col)}{row}:{get_column_letter(last_col)}{row}")
+
+    quants, expense, performance, rating = blocks['quants'], blocks['expense'], blocks['performance'], blocks['rating']
+    banner(8, 2, 3, "Corpus")
+    banner(8, quants, quants + 5, "Debt Quants")
+    banner(8, expense, expense + 1, "Historical Expense Ratio")
+    banner(8, performance, performance + len(PERFORMANCE_HEADERS) - 1, "Performance (%)")
+    banner(8, rating, rating + 2 * len(RATING_BLOCK) - 1, "Rating Allocation")
+    rows[8][1] = "AUM (Cr.)"
+    rows[8][expense - 1] = "Direct Expense Ratio"
+    banner(9, quants, quants + 2, OLDER_MONTH_ID)
+    banner(9, quants + 3, quants + 5, LATEST_MONTH_ID)
+    banner(9, rating, rating + len(RATING_BLOCK) - 1, OLDER_MONTH_ID)
+    banner(9, rating + len(RATING_BLOCK), rating + 2 * len(RATING_BLOCK) - 1, LATEST_MONTH_ID)
+
+    # Decorative two-cell merges in the empty rows 4..7 make up the requested merged-range count
+    extra = max(0, merged_range_count - len(merged))
+    for row in range(4, 8):
+        for col in range(1, width, 2):
+            if extra == 0:
+                break
+            merged.append(f"{get_column_letter(col)}{row}:{get_column_letter(col + 1)}{row}")
+            extra -= 1
+    return rows, merged
+
+
+def _maybe_blank(rng, value, blank_ratio):
+    roll = rng.random()
+    if roll < blank_ratio / 2:
+        return None
+    if roll < blank_ratio:
+        return "-"
+    return value
+
+
+def _raw_row(rng, sheet_index, row_index, headers, blocks, blank_ratio):
+    row = [f"Synthetic Fund {sheet_index:02d}-{row_index:05d} - Direct Plan - Growth",
+           _maybe_blank(rng, round(rng.uniform(50, 50000), 2), 0.05)]
+    row.append(_maybe_blank(rng, round(rng.uniform(50, 50000), 2), blank_ratio))
+    older_quants = [round(rng.uniform(0.01, 15), 4) for _ in QUANT_HEADERS]
+    row += older_quants + [_maybe_blank(rng, round(v * rng.uniform(0.9, 1.1), 4), blank_ratio) for v in older_quants]
+    older_expense = round(rng.uniform(0.05, 1.5), 2)
+    row += [older_expense, _maybe_blank(rng, older_expense, blank_ratio)]
+    row += [LATEST_DATE - timedelta(days=rng.randint(0, 3)), round(rng.uniform(10, 5000), 4)]
+    row += [round(rng.uniform(-2, 12), 4) for _ in PERFORMANCE_HEADERS[2:]]
+    older_rating = [round(rng.uniform(0, 60), 2) if rng.random() < 0.6 else None for _ in RATING_BLOCK]
+    if rng.random() < blank_ratio:
+        row += older_rating + [None] * len(RATING_BLOCK)
+    else:
+        row += older_rating + [round(v * rng.uniform(0.9, 1.1), 2) if v else None for v in older_rating]
+    row += [round(rng.uniform(0, 100), 3) for _ in range(blocks['details'] - len(row) - 1)]
+    row += ["Nil", _maybe_blank(rng, "Synthetic remark", 0.5),
+            datetime(2013, 1, 1) + timedelta(days=rng.randint(0, 4000)), f"Manager {rng.randint(1, 400)}"]
+    return row
+
+
+def generate_raw_workbook(path, sheet_count=15, rows_per_sheet=30, column_count=60, merged_range_count=21,
+                          blank_ratio=0.1, seed=0):
+    """Writes a synthetic raw workbook (streamed, so large sizes stay cheap to generate)."""
+    rng = random.Random(seed)
+    headers, blocks = raw_layout(column_count)
+    band, merged = _banner_rows(headers, blocks, max(merged_range_count, BASE_MERGED_RANGES))
+    wb = openpyxl.Workbook(write_only=True)
+    home = wb.create_sheet("Home")
+    home.append([None, "Corpcare Daily Performance Report."])
+    for sheet_index, name in enumerate(sheet_names(sheet_count), 1):
+        ws = wb.create_sheet(name)
+        for merged_range in merged:
+            ws.merged_cells.add(merged_range)
+        for row in band:
+            ws.append(row)
+        ws.append(headers)
+        for row_index in range(1, rows_per_sheet + 1):
+            ws.append(_raw_row(rng, sheet_index, row_index, headers, blocks, blank_ratio))
+    wb.save(path)
+    return path
+
+
+def template_headers():
+    return (["Scheme Name", OLDER_DATE] + QUANT_HEADERS + ["Direct Expense Ratio"] + PERFORMANCE_HEADERS[1:]
+            + RATING_BLOCK + TEMPLATE_DETAIL_HEADERS)
+
+
+def generate_template_workbook(path, sheet_count=15, placeholder_rows=20, benchmark_rows=3):
+    """Writes a synthetic template: same sheet names, header at row 7, stale rows and a Benchmark table."""
+    headers = template_headers()
+    wb = openpyxl.Workbook()
+    wb.active.title = "Home"
+    for name in sheet_names(sheet_count):
+        ws = wb.create_sheet(name)
+        ws["A2"] = "Home"
+        ws["A3"] = f"As on {OLDER_DATE.strftime('%Y-%b-%d')}"
+        ws["A5"], ws["B5"], ws["C5"] = "DIRECT PLAN", "Corpus", "Debt Quants"
+        ws["B6"] = "AUM (Cr.)"
+        for col, header in enumerate(headers, 1):
+            ws.cell(row=TEMPLATE_HEADER_ROW, column=col, value=header)
+        for row in range(TEMPLATE_HEADER_ROW + 1, TEMPLATE_HEADER_ROW + placeholder_rows + 1):
+            ws.cell(row=row, column=1, value=f"Old Scheme {row}")
+            for col in range(2, len(headers) + 1):
+                ws.cell(row=row, column=col, value=1.0)
+        benchmark_row = TEMPLATE_HEADER_ROW + placeholder_rows + 2
+        ws.cell(row=benchmark_row, column=1, value="Benchmark")
+        for row in range(benchmark_row + 1, benchmark_row + benchmark_rows + 1):
+            ws.cell(row=row, column=1, value=f"Index {row}")
+            ws.cell(row=row, column=2, value=2.5)
+    disclaimer = wb.create_sheet("Disclaimer ")
+    disclaimer["A1"] = "Synthetic disclaimer."
+    wb.save(path)
+    return path
@@ -0,0 +1,56 @@
+import argparse
+import logging
+import os
+
+from config import raw_file, output_file, SHEETS_TO_IGNORE, LOGO_FILENAME, HISTORY_DB
+from instrumentation import RunReport
+from main import main
+from schema import MAPPING_FILE_ENV, current_schema
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fill the Daily Performance template from a raw Excel file.")
+    parser.add_argument("raw_file", nargs="?", default=raw_file, help=f"raw Excel file (default: {raw_file})")
+    parser.add_argument("-o", "--output", default=output_file, help=f"output file (default: {output_file})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to extract and resolve the raw sheets in parallel (default: 1, serial)")
+    parser.add_argument("--writer", choices=("openpyxl", "patch"), default="openpyxl",
+                        help="openpyxl re-serialises the whole workbook; patch rewrites only the modified sheets "
+                             "and copies every other part of the template unchanged (default: openpyxl)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="re-fill an existing output in place: only sheets and rows whose raw data changed since "
+                             "the last --incremental run are rewritten (state kept in OUTPUT.state.json)")
+    parser.add_argument("--history", nargs="?", const=HISTORY_DB, metavar="DB",
+                        help=f"also store the report's values in a SQLite history database (default: {HISTORY_DB}), "
+                             "see history.py")
+    parser.add_argument("--compare", nargs="+", default=(), metavar="RAW",
+                        help="earlier raw files (e.g. yesterday's, last week's): every sheet gets delta columns of "
+                             "the metrics in COMPARE_METRICS against each of them, matched by Scheme Name")
+    parser.add_argument("--mapping", metavar="PATH",
+                        help="JSON or YAML column mapping to use instead of the one in config.py, see schema.py")
+    parser.add_argument("--report", metavar="PATH",
+                        help="write a JSON run report (time, calls, rows, older-data fallbacks, peak memory per stage "
+                             "and per sheet) to PATH")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log per-row debug details")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only log warnings and errors")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO,
+                        format="%(message)s")
+    if args.mapping:
+        os.environ[MAPPING_FILE_ENV] = args.mapping
+        current_schema()  # an invalid mapping file fails here, before any work
+    if args.report:
+        report = RunReport()
+        with report.activate():
+            main(args.raw_file, args.output, SHEETS_TO_IGNORE, LOGO_FILENAME, workers=args.workers,
+                 writer=args.writer, incremental=args.incremental, history_db=args.history,
+                 compare_with=args.compare)
+        report.to_json(args.report)
+        logging.info(f"Run report written to {args.report}")
+    else:
+        main(args.raw_file, args.output, SHEETS_TO_IGNORE, LOGO_FILENAME, workers=args.workers, writer=args.writer,
+             incremental=args.incremental, history_db=args.history, compare_with=args.compare)
@@ -0,0 +1,173 @@
+"""
+Comparison of a report's raw file with earlier raw files, e.g. yesterday's and last week's.
+
+The earlier files are resolved with the same header and month-ID logic as the report's own file, in a
+pool of processes while the report's file is resolved in this one. Every sheet's rows are matched to the
+earlier sheets' rows by "Scheme Name" through one dict per earlier sheet, and for each metric in
+COMPARE_METRICS that the sheet has, a delta column (now minus then) per earlier file is added to the right
+of the template's columns. Conditional formatting colours rises green and falls red, so the report is
+still written in a single save.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from config import COMPARE_METRICS
+from instrumentation import instrumented, stage, sheet_scope, count
+from resolve import resolve_raw_sheets
+from styling import CellStyles
+
+DELTA_COLUMN_WIDTH = 14
+
+_thin_side = Side(border_style="thin", color="000000")
+COMPARE_STYLES = {
+    'delta': {'number_format': '+0.00;-0.00;0.00', 'alignment': Alignment(horizontal='center', vertical='center'),
+              'border': Border(left=_thin_side, right=_thin_side, top=_thin_side, bottom=_thin_side)},
+}
+# Conditional formats of the delta columns
+_RISE = {'fill': PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"),
+         'font': Font(color="006100")}
+_FALL = {'fill': PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"),
+         'font': Font(color="9C0006")}
+
+
+def resolve_with_baselines(raw_file, earlier_files, layouts, sheets_to_ignore=(), workers=1):
+    """
+    Resolves raw_file (with `workers` as resolve_raw_sheets does) and every earlier file at the same time,
+    or one after the other on a single CPU. Returns (resolved sheets of raw_file, [resolved sheets of each
+    earlier file]).
+    """
+    if (os.cpu_count() or 1) == 1:
+        resolved_sheets = resolve_raw_sheets(raw_file, layouts, sheets_to_ignore, workers)
+        with stage('resolve_baselines'):
+            baselines = [resolve_raw_sheets(earlier, layouts, sheets_to_ignore) for earlier in earlier_files]
+        return resolved_sheets, baselines
+    with ProcessPoolExecutor(max_workers=min(len(earlier_files), os.cpu_count())) as pool:
+        futures = [pool.submit(resolve_raw_sheets, earlier, layouts, sheets_to_ignore) for earlier in earlier_files]
+        resolved_sheets = resolve_raw_sheets(raw_file, layouts, sheets_to_ignore, workers)
+        with stage('resolve_baselines'):
+            return resolved_sheets, [future.result() for future in futures]
+
+
+def _file_label(raw_file, number):
+    if isinstance(raw_file, (str, os.PathLike)):
+        return os.path.splitext(os.path.basename(raw_file))[0]
+    return f"earlier file {number}"
+
+
+def baseline_labels(earlier_files, baselines):
+    """
+    Names of the earlier files in the delta headers: their "As on" dates, or their file names where a
+    file has no date or shares it with another one.
+    """
+    dates = [next((resolved['as_on_date'] for resolved in baseline.values() if resolved['as_on_date']), None)
+             for baseline in baselines]
+    return [as_on.strftime('%d-%b-%Y') if as_on and dates.count(as_on) == 1 else _file_label(earlier, number)
+            for number, (earlier, as_on) in enumerate(zip(earlier_files, dates), 1)]
+
+
+def metric_columns(resolved):
+    """{header: values} of a resolved sheet, the last block of a header winning as it does in the report."""
+    return {block['header']: block['values'] for block in resolved['blocks']}
+
+
+def scheme_rows(resolved):
+    """{scheme name: row offset} of a resolved sheet; the first row of a repeated name wins."""
+    rows = {}
+    for offset, scheme in enumerate(metric_columns(resolved).get("Scheme Name", ())):
+        if scheme is not None:
+            rows.setdefault(str(scheme).strip(), offset)
+    return rows
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def sheet_deltas(resolved, earlier, metrics=COMPARE_METRICS):
+    """
+    [(metric, deltas)] of one resolved sheet against the same sheet of an earlier file: deltas has one
+    value per row of `resolved`, None where either side has no number or the scheme is not in the earlier
+    sheet. Metrics the sheet does not have are left out.
+    """
+    now, then = metric_columns(resolved), metric_columns(earlier) if earlier else {}
+    schemes = now.get("Scheme Name")
+    if not schemes:
+        return []
+    rows = scheme_rows(earlier) if earlier else {}
+    matched = [rows.get(str(scheme).strip()) if scheme is not None else None for scheme in schemes]
+    count('schemes_unmatched', matched.count(None))
+    deltas = []
+    for metric in metrics:
+        if metric not in now:
+            continue
+        current, previous = now[metric], then.get(metric)
+        values = [None] * len(schemes)
+        if previous is not None:
+            for i, offset in enumerate(matched):
+                if offset is not None and (a := _number(current[i])) is not None and \
+                        (b := _number(previous[offset])) is not None:
+                    values[i] = round(a - b, 10)
+        deltas.append((metric, values))
+    return deltas
+
+
+@instrumented
+def write_comparison(template_sheet, layout, resolved, earlier_sheets, labels, metrics=COMPARE_METRICS):
+    """
+    Writes the delta columns of one sheet, one group per earlier file, starting two columns to the right
+    of the template's last column. Headers take the style of the template's header row.
+    """
+    header_row = layout['header_row']
+    last_col = max([*layout['dest_col_map'].values(), layout['aum_dest_col'] or 0])
+    header_style = template_sheet.cell(row=header_row, column=last_col)._style
+    styles = CellStyles.of(template_sheet.parent, COMPARE_STYLES)
+    col = last_col + 2
+    for earlier, label in zip(earlier_sheets, labels):
+        deltas = sheet_deltas(resolved, earlier, metrics)
+        if not deltas:
+            continue
+        first_col = col
+        for metric, values in deltas:
+            header = template_sheet.cell(row=header_row, column=col, value=f"Δ {metric}")
+            header._style = copy(header_style)
+            cells = []
+            for offset, value in enumerate(values):
+                cell = template_sheet.cell(row=header_row + 1 + offset, column=col)
+                cell.value = value
+                cells.append(cell)
+            styles.apply(cells, 'delta')
+            template_sheet.column_dimensions[get_column_letter(col)].width = DELTA_COLUMN_WIDTH
+            count('delta_cells', len(values))
+            col += 1
+
+        title = template_sheet.cell(row=header_row - 1, column=first_col, value=f"Change vs {label}")
+        title._style = copy(header_style)
+        if col - 1 > first_col:
+            template_sheet.merge_cells(start_row=header_row - 1, end_row=header_row - 1, start_column=first_col,
+                                       end_column=col - 1)
+        if resolved['row_count']:
+            cell_range = (f"{get_column_letter(first_col)}{header_row + 1}:"
+                          f"{get_column_letter(col - 1)}{header_row + resolved['row_count']}")
+            template_sheet.conditional_formatting.add(cell_range, CellIsRule(operator='greaterThan', formula=['0'],
+                                                                             **_RISE))
+            template_sheet.conditional_formatting.add(cell_range, CellIsRule(operator='lessThan', formula=['0'],
+                                                                             **_FALL))
+        col += 1  # a blank column between groups
+
+
+@instrumented
+def write_comparisons(template_wb, resolved_sheets, baselines, labels, layouts, sheets_to_ignore=()):
+    """Adds the delta columns against every baseline (resolved earlier file) to every filled sheet."""
+    for sheet_name, resolved in resolved_sheets.items():
+        layout = layouts.get(sheet_name)
+        if sheet_name in sheets_to_ignore or sheet_name not in template_wb.sheetnames or layout is None or \
+                resolved['header_row'] == -1:
+            continue
+        with sheet_scope(sheet_name):
+            write_comparison(template_wb[sheet_name], layout, resolved,
+                             [baseline.get(sheet_name) for baseline in baselines], labels)
@@ -1,8 +1,24 @@
+import os
+import tempfile
+
 raw_file = "Daily Performance - Testing.xlsx"
 template_file = "Daily Performance Template.xlsx"
 output_file = "Daily Performance - Filled.xlsx"
 SHEETS_TO_IGNORE = ['Home', 'Sheet1', 'Disclaimer']
 LOGO_FILENAME = "corpcare_logo.jpg"
+# Generated reports kept for repeat uploads (see result_cache.py)
+RESULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "excel_automation_results")
+RESULT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+# Uploads processed at the same time by the web UI's background workers, and how long a finished
+# job's report stays available to its session (see jobs.py)
+JOB_WORKERS = 2
+JOB_KEEP_SECONDS = 3600
+# Metrics (resolved headers) that get a delta column per earlier raw file in comparison runs (see compare.py)
+COMPARE_METRICS = ["YTM (%)", "AUM", "Modified Duration Years", "Average Maturity Years", "Direct Expense Ratio"]
+# SQLite store of every report's values (see history.py), used with --history
+HISTORY_DB = "fund_history.sqlite3"
+# Output file name of every raw file in a batch run (see batch.py), formatted with the raw file's date
+BATCH_OUTPUT_NAME = "Daily Performance - {date:%d %b %Y}.xlsx"
 
 # --- MAPPING & STYLING CONFIGURATION ---
 RAW_TO_TEMPLATE_HEADER_MAP = {
@@ -19,7 +35,7 @@ RAW_TO_TEMPLATE_HEADER_MAP = {
     "A / A+ / A1+ / A1-": "A / A+ / A1+ / A1-",
     "AA / AA+ / AA-": "AA / AA+ / AA-", "AAA": "AAA", "Unrated": "Unrated", "D": "D", "A1+ / A1-": "A1+ / A1-",
     "Exit Load": "Exit Load", "Remark": "Remark", "Inception Date": "Inception Date",
-    "[Fund Manager 1]": "Fund Manager",
+    "[Fund Manager 1]": "Fund Manager", "A / A+ / A-": "A / A+ / A-",
 }
 MONTH_GROUPED_HEADERS = ["Average Maturity Years", "Modified Duration Years", "YTM (%)", "Direct Expense Ratio",
                          "Cash & Equivalent", "Others", "SOV", "A / A+ / A1+ / A1-", "AA / AA+ / AA-", "AAA", "Unrated",
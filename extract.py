@@ -0,0 +1,103 @@
+import openpyxl
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.worksheet._reader import WorkSheetParser
+from helper import HeaderBandIndex, HeaderScan
+from instrumentation import instrumented, sheet_scope
+
+# Rows searched for the "Scheme Name" header
+HEADER_SEARCH_ROWS = 24
+
+
+class RawSheetData:
+    """
+    Values of one raw sheet pulled out of the workbook: the header band (rows 1..header row) with its
+    merged-cell index and what the header scan noted in it, and the data rows below the header stored
+    column by column.
+    """
+
+    def __init__(self, title, header_index, header_row, columns, row_count, scan=None):
+        self.title = title
+        self.header_index = header_index
+        self.header_row = header_row
+        self.columns = columns  # columns[c - 1][i] is the value of column c in the i-th data row
+        self.row_count = row_count
+        self.as_on_date = scan and scan.as_on_date
+        self.month_banners = scan.month_banners if scan else {}
+        self.date_headers = scan.date_headers if scan else {}
+
+    @property
+    def header_values(self):
+        return self.header_index.row_values(self.header_row)
+
+    def column(self, col):
+        return self.columns[col - 1] if 1 <= col <= len(self.columns) else (None,) * self.row_count
+
+    def value(self, row_index, col):
+        return self.columns[col - 1][row_index] if 1 <= col <= len(self.columns) else None
+
+
+def _pad(values, width):
+    return tuple(values) + (None,) * (width - len(values)) if len(values) < width else tuple(values)
+
+
+@instrumented
+def extract_sheet(worksheet):
+    """
+    Streams one read-only worksheet in a single pass and returns its RawSheetData: a HeaderScan reads
+    the band up to the header row, the data rows are read from where it stopped, and the rest of the sheet
+    is only drained for the merged ranges stored after the cell data. Only those rows are materialised.
+    """
+    src = worksheet._get_source()
+    parser = WorkSheetParser(src, worksheet._shared_strings, data_only=True, epoch=worksheet.parent.epoch,
+                             date_formats=worksheet.parent._date_formats)
+    parsed_rows = iter(parser.parse())
+    data_rows = []
+    widths = [worksheet.max_column or 0]
+    try:
+        scan = HeaderScan(((idx, worksheet._get_row(cells, values_only=True)) for idx, cells in parsed_rows),
+                          max_row=HEADER_SEARCH_ROWS)
+        if scan.header_row != -1:
+            expected_row = scan.header_row + 1
+            for idx, values in scan.rows:
+                if idx != expected_row:  # rows missing from the xml are empty rows, so the data ended
+                    break
+                widths.append(len(values))
+                if not (values and values[0]):
+                    break
+                data_rows.append(values)
+                expected_row += 1
+        for _ in parsed_rows:
+            pass
+    finally:
+        src.close()
+    width = max(widths + [len(row) for row in scan.band])
+
+    merged_ranges = []
+    if parser.merged_cells:
+        for merged_cell in parser.merged_cells.mergeCell:
+            min_col, min_row, max_col, max_row = range_boundaries(merged_cell.ref)
+            merged_ranges.append((min_row, min_col, max_row, max_col))
+
+    header_index = HeaderBandIndex((_pad(row, width) for row in scan.band), merged_ranges)
+    columns = [tuple(col) for col in zip(*(_pad(row, width) for row in data_rows))] if data_rows else \
+        [()] * width
+    return RawSheetData(worksheet.title, header_index, scan.header_row, columns, len(data_rows), scan)
+
+
+@instrumented
+def extract_raw_workbook(raw_file, sheets_to_ignore=()):
+    """
+    Opens the raw workbook in read-only mode and extracts every sheet that is not ignored.
+    Returns {sheet_name: RawSheetData} in workbook order.
+    """
+    raw_wb = openpyxl.load_workbook(raw_file, read_only=True, data_only=True)
+    raw_sheets = {}
+    try:
+        for ws in raw_wb.worksheets:
+            if ws.title in sheets_to_ignore:
+                continue
+            with sheet_scope(ws.title):
+                raw_sheets[ws.title] = extract_sheet(ws)
+        return raw_sheets
+    finally:
+        raw_wb.close()
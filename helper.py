@@ -1,4 +1,8 @@
+import hashlib
+import os
+import re
 from datetime import datetime, timedelta
+from functools import lru_cache
 
 
 def is_meaningful_data(val):
@@ -12,61 +16,207 @@ def is_meaningful_data(val):
     return True
 
 
+DATE_FORMATS = ("%d-%b-%Y", "%d-%b-%y", "%d-%b-%Y ", "%d-%m-%Y", "%Y-%m-%d")
+# Shape of a string each format can parse, checked before calling strptime. No string has two shapes,
+# so the order only matters for speed.
+_DATE_SHAPES = ((re.compile(r"\d{1,2}-[A-Za-z]{3}-\d{4}"), "%d-%b-%Y"),
+                (re.compile(r"\d{1,2}-[A-Za-z]{3}-\d{2}"), "%d-%b-%y"),
+                (re.compile(r"\d{1,2}-\d{1,2}-\d{4}"), "%d-%m-%Y"),
+                (re.compile(r"\d{4}-\d{1,2}-\d{1,2}"), "%Y-%m-%d"))
+
+
 def is_date_like(v):
     if v is None: return None
     if isinstance(v, datetime): return v
     if isinstance(v, str):
-        for fmt in ("%d-%b-%Y", "%d-%b-%y", "%d-%b-%Y ", "%d-%m-%Y", "%Y-%m-%d"):
-            try:
-                return datetime.strptime(v.strip(), fmt)
-            except Exception:
-                continue
+        return _parse_date_string(v.strip())
     return None
 
 
-def find_header_row(sheet, keyword="Scheme Name"):
-    for r in range(1, 25):
-        for cell in sheet[r]:
+@lru_cache(maxsize=4096)
+def _parse_date_string(text):
+    """
+    Parses text with the first of DATE_FORMATS that accepts it, or returns None. Headers repeat across
+    sheets, hence the cache; a regex on the shape of the text picks the format so most misses never reach
+    strptime. The shape cannot tell a real date from an impossible one ("31-02-2025", "12-Foo-2025"),
+    so the one strptime call it leads to still catches ValueError.
+    """
+    if "-" not in text:  # every format has a literal "-"
+        return None
+    for shape, fmt in _DATE_SHAPES:
+        if shape.fullmatch(text):
             try:
-                if cell.value and str(cell.value).strip() == keyword: return r
-            except Exception:
+                return datetime.strptime(text, fmt)
+            except ValueError:  # right shape, impossible date
+                return None
+    # Shapes strptime also tolerates (e.g. padded fields) go through the formats the slow way
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class HeaderBandIndex:
+    """
+    Values of the top rows of a sheet (the header band) plus a lookup from every cell covered by a
+    merged range to that range's top-left cell, built once per sheet and shared by the header helpers.
+    """
+
+    def __init__(self, rows, merged_ranges=()):
+        # rows: tuples of cell values for rows 1..n; merged_ranges: (min_row, min_col, max_row, max_col)
+        self.rows = [tuple(row) for row in rows]
+        self.merged = {}
+        band_end = len(self.rows)
+        for min_row, min_col, max_row, max_col in merged_ranges:
+            if min_row > band_end:
+                continue
+            for r in range(min_row, min(max_row, band_end) + 1):
+                for c in range(min_col, max_col + 1):
+                    self.merged.setdefault((r, c), (min_row, min_col))
+
+    @classmethod
+    def from_sheet(cls, sheet, max_row=24):
+        max_row = min(max_row, sheet.max_row)
+        rows = sheet.iter_rows(min_row=1, max_row=max_row, max_col=sheet.max_column, values_only=True)
+        merged_ranges = []
+        for merged_range in sheet.merged_cells.ranges:
+            min_col, min_row, max_col, max_row_ = merged_range.bounds
+            merged_ranges.append((min_row, min_col, max_row_, max_col))
+        return cls(rows, merged_ranges)
+
+    def value(self, row, col):
+        if 1 <= row <= len(self.rows) and 1 <= col <= len(self.rows[row - 1]):
+            return self.rows[row - 1][col - 1]
+        return None
+
+    def merged_value(self, row, col):
+        """Value of the top-left cell of the merged range covering (row, col), None if it is not merged."""
+        top_left = self.merged.get((row, col))
+        return self.value(*top_left) if top_left else None
+
+    def row_values(self, row):
+        return self.rows[row - 1] if 1 <= row <= len(self.rows) else ()
+
+
+class HeaderScan:
+    """
+    One pass over the top rows of a sheet that stops at the "Scheme Name" header row. It keeps the rows
+    read (the header band) and notes on the way the "As on" cell and date, the month-ID banners and the
+    dated headers of the header row. `rows` is the iterator it read from, left at the first data row.
+    """
+
+    def __init__(self, rows, keyword="Scheme Name", max_row=24, as_on_rows=10):
+        # rows: (row number, tuple of values) in row order; rows left out (empty rows) may be skipped.
+        # With keyword None it reads all of the first max_row rows.
+        self.rows = rows
+        self.band = []
+        self.header_row = -1
+        self.as_on_cell = None  # (row, col) of the first "As on ..." cell
+        self.as_on_date = None  # date of the first "As on ..." cell that parses
+        self.month_banners = {}  # {(row, col): month ID} of every cell holding a six-digit month ID
+        self.date_headers = {}  # {col: datetime} of the dated cells of the header row
+        for idx, values in rows:
+            if idx > max_row:
+                break
+            self.band.extend(() for _ in range(idx - 1 - len(self.band)))
+            self.band.append(values)
+            self._note(idx, values, idx <= as_on_rows)
+            if keyword and any(value and str(value).strip() == keyword for value in values):
+                self.header_row = idx
+                self.date_headers = {c: d for c, value in enumerate(values, 1) if (d := is_date_like(value))}
+                break
+
+    def _note(self, idx, values, as_on_row):
+        for c, value in enumerate(values, 1):
+            if value is None:
                 continue
-    return -1
+            if isinstance(value, int) and len(str(value)) == 6:
+                self.month_banners[(idx, c)] = value
+            elif as_on_row and isinstance(value, str) and value.strip().startswith("As on"):
+                self.as_on_cell = self.as_on_cell or (idx, c)
+                self.as_on_date = self.as_on_date or parse_as_on_date(value)
+
+
+AS_ON_DATE_FORMATS = ("%Y-%b-%d", "%d %b %Y", "%d-%b-%Y", "%d-%m-%Y", "%Y-%m-%d", "%d.%m.%Y")
+
+
+def parse_date(text):
+    """Date of a text in one of AS_ON_DATE_FORMATS, or None."""
+    for fmt in AS_ON_DATE_FORMATS:
+        try:
+            return datetime.strptime(text.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_as_on_date(value):
+    """Date of an "As on ..." banner value, or None when the value is not one."""
+    if isinstance(value, str) and value.strip().startswith("As on"):
+        return parse_date(value.strip()[len("As on"):])
+    return None
+
+
+def find_as_on_cell(sheet):
+    """Coordinate of the "As on ..." cell in the first 10 rows, or None."""
+    scan = HeaderScan(enumerate(sheet.iter_rows(max_row=10, values_only=True), 1), keyword=None, max_row=10)
+    return scan.as_on_cell and sheet.cell(*scan.as_on_cell).coordinate
+
 
+def find_benchmark_row(sheet):
+    """Row of the "Benchmark" table title in column A, or -1."""
+    return next((r for r in range(1, sheet.max_row + 1) if
+                 str(sheet.cell(row=r, column=1).value).strip().lower() == "benchmark"), -1)
 
-def update_as_on_date(sheet):
-    for r in range(1, 11):
-        for cell in sheet[r]:
-            if cell.value and str(cell.value).strip().startswith("As on"):
-                yesterday = datetime.today() - timedelta(days=1)
 
-                cell.value = f"As on {yesterday.strftime('%Y-%b-%d')}"
-                return True
+def update_as_on_date(sheet, coordinate=None, as_on=None):
+    if coordinate := coordinate or find_as_on_cell(sheet):
+        # The report is as on yesterday unless the caller knows the raw file's own date
+        as_on = as_on or datetime.today() - timedelta(days=1)
+
+        sheet[coordinate].value = f"As on {as_on.strftime('%Y-%b-%d')}"
+        return True
     return False
 
 
-def get_month_id_for_column(sheet, row, col):
-    for r in range(row - 1, 0, -1):
-        cell = sheet.cell(row=r, column=col)
-        for merged_range in sheet.merged_cells.ranges:
-            if merged_range.min_row <= r <= merged_range.max_row and merged_range.min_col <= col <= merged_range.max_col:
-                top_left_cell = sheet.cell(row=merged_range.min_row, column=merged_range.min_col)
-                if isinstance(top_left_cell.value, int) and len(str(top_left_cell.value)) == 6:
-                    return top_left_cell.value
+_SHA_CACHE = {}  # path -> ((size, mtime_ns), hex digest)
+
+
+def file_sha256(path):
+    """SHA-256 of a file, recomputed only when its size or mtime changes."""
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _SHA_CACHE.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    _SHA_CACHE[path] = (stamp, digest.hexdigest())
+    return _SHA_CACHE[path][1]
+
+
+def banner_month_id(header_index, month_banners, header_row, col):
+    """
+    Month ID of the first merged banner above col going up from the header row, looked up in the
+    month_banners a HeaderScan noted, or None.
+    """
+    for r in range(header_row - 1, 0, -1):
+        if (top_left := header_index.merged.get((r, col))) in month_banners:
+            return month_banners[top_left]
     return None
 
 
 
 
-def get_parent_header_for_column(sheet, header_row, col):
+def get_parent_header_for_column(header_index, header_row, col):
     for r in range(header_row - 1, 0, -1):
-        cell = sheet.cell(row=r, column=col)
-        val = cell.value
+        val = header_index.value(r, col)
         if val is None:
-            for merged_range in sheet.merged_cells.ranges:
-                if merged_range.min_row <= r <= merged_range.max_row and merged_range.min_col <= col <= merged_range.max_col:
-                    top_left = sheet.cell(row=merged_range.min_row, column=merged_range.min_col)
-                    if top_left.value: return str(top_left.value).strip()
+            if top_left_value := header_index.merged_value(r, col): return str(top_left_value).strip()
             continue
         if isinstance(val, int) and len(str(val)) == 6: continue
         if is_date_like(val): continue
@@ -0,0 +1,163 @@
+"""
+Local SQLite store of the values written to every report, for time-series lookups without re-opening
+old workbooks.
+
+    python history.py "Axis Liquid Fund(G)-Direct Plan" "YTM (%)" --days 90
+
+Every run records, per sheet and scheme, the value written under each template header (the metric)
+keyed by the raw file's "As on" date. Re-running a day replaces that day's values.
+"""
+import argparse
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from config import HISTORY_DB
+from instrumentation import instrumented
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    sheet TEXT NOT NULL,
+    scheme TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    as_of TEXT NOT NULL,
+    value,
+    is_older INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (sheet, scheme, metric, as_of)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metrics_by_scheme ON metrics (scheme, metric, as_of);
+CREATE INDEX IF NOT EXISTS metrics_by_date ON metrics (metric, as_of);
+CREATE TABLE IF NOT EXISTS sheet_runs (
+    sheet TEXT NOT NULL,
+    as_of TEXT NOT NULL,
+    latest_month_id INTEGER,
+    older_month_id INTEGER,
+    row_count INTEGER NOT NULL,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (sheet, as_of)
+) WITHOUT ROWID;
+"""
+
+# month_id of a value: the older month when the report fell back to it, else the latest month
+_MONTH_ID = "CASE WHEN m.is_older THEN r.older_month_id ELSE r.latest_month_id END"
+
+
+def _storable(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def metric_rows(sheet_name, resolved, as_of):
+    """
+    (sheet, scheme, metric, as_of, value, is_older) for every non-empty value of a resolved sheet, taking
+    the last block per destination column just as the report does. The first row of a repeated scheme
+    name wins.
+    """
+    blocks = {}
+    for block in resolved['blocks']:
+        blocks[block['dest_col']] = block
+    schemes = next((block['values'] for block in blocks.values() if block['header'] == "Scheme Name"), None)
+    if schemes is None:
+        return
+    rows = {}
+    for offset, scheme in enumerate(schemes):
+        if scheme is not None:
+            rows.setdefault(str(scheme).strip(), offset)
+    for block in blocks.values():
+        if block['header'] == "Scheme Name":
+            continue
+        values, is_older = block['values'], block['is_older']
+        for scheme, offset in rows.items():
+            if (value := values[offset]) is not None and str(value).strip() != "":
+                yield sheet_name, scheme, block['header'], as_of, _storable(value), int(is_older[offset])
+
+
+class HistoryStore:
+    """The history database at path, created on first use. Usable as a context manager."""
+
+    def __init__(self, path=HISTORY_DB):
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @instrumented
+    def record_run(self, resolved_sheets, as_of=None):
+        """
+        Stores every resolved sheet in one transaction, replacing what was stored for the same day.
+        as_of defaults to each sheet's "As on" date, else today. Returns the number of values stored.
+        """
+        stored = 0
+        recorded_at = datetime.now().isoformat(timespec="seconds")
+        with self.connection:
+            for sheet_name, resolved in resolved_sheets.items():
+                if not resolved['row_count']:
+                    continue
+                day = (as_of or resolved.get('as_on_date') or date.today()).isoformat()
+                self.connection.execute("DELETE FROM metrics WHERE sheet = ? AND as_of = ?", (sheet_name, day))
+                cursor = self.connection.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?, ?, ?)",
+                                                     metric_rows(sheet_name, resolved, day))
+                stored += cursor.rowcount
+                self.connection.execute("INSERT OR REPLACE INTO sheet_runs VALUES (?, ?, ?, ?, ?, ?)",
+                                        (sheet_name, day, resolved['latest_month_id'], resolved['older_month_id'],
+                                         resolved['row_count'], recorded_at))
+        return stored
+
+    def history(self, scheme, metric, start=None, end=None, sheet=None):
+        """[(as_of, value, month_id, is_older)] of one scheme's metric, oldest first, optionally within [start, end]."""
+        query = (f"SELECT m.as_of, m.value, {_MONTH_ID}, m.is_older FROM metrics m "
+                 "JOIN sheet_runs r ON r.sheet = m.sheet AND r.as_of = m.as_of "
+                 "WHERE m.scheme = ? AND m.metric = ?")
+        params = [scheme, metric]
+        for clause, value in (("m.as_of >= ?", start), ("m.as_of <= ?", end), ("m.sheet = ?", sheet)):
+            if value is not None:
+                query += f" AND {clause}"
+                params.append(value.isoformat() if isinstance(value, date) else value)
+        rows = self.connection.execute(query + " ORDER BY m.as_of", params).fetchall()
+        return [(date.fromisoformat(as_of), value, month_id, bool(is_older))
+                for as_of, value, month_id, is_older in rows]
+
+    def snapshot(self, metric, as_of, sheet=None):
+        """{scheme: value} of a metric across schemes on one day."""
+        query = "SELECT scheme, value FROM metrics WHERE metric = ? AND as_of = ?"
+        params = [metric, as_of.isoformat() if isinstance(as_of, date) else as_of]
+        if sheet is not None:
+            query += " AND sheet = ?"
+            params.append(sheet)
+        return dict(self.connection.execute(query, params).fetchall())
+
+    def dates(self, sheet=None):
+        """Days stored, oldest first."""
+        query = "SELECT DISTINCT as_of FROM sheet_runs" + (" WHERE sheet = ?" if sheet else "") + " ORDER BY as_of"
+        return [date.fromisoformat(row[0]) for row in self.connection.execute(query, (sheet,) if sheet else ())]
+
+    def schemes(self, sheet=None):
+        query = "SELECT DISTINCT scheme FROM metrics" + (" WHERE sheet = ?" if sheet else "") + " ORDER BY scheme"
+        return [row[0] for row in self.connection.execute(query, (sheet,) if sheet else ())]
+
+    def metrics(self):
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT metric FROM metrics ORDER BY metric")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the stored history of one scheme's metric.")
+    parser.add_argument("scheme")
+    parser.add_argument("metric", help='template header, e.g. "YTM (%%)"')
+    parser.add_argument("--days", type=int, help="only the last DAYS days")
+    parser.add_argument("--db", default=HISTORY_DB, help=f"history database (default: {HISTORY_DB})")
+    args = parser.parse_args()
+    with HistoryStore(args.db) as store:
+        start = date.today() - timedelta(days=args.days) if args.days else None
+        for as_of, value, month_id, is_older in store.history(args.scheme, args.metric, start=start):
+            print(f"{as_of}  {value}" + (f"  (older month {month_id})" if is_older else ""))
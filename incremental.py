@@ -0,0 +1,100 @@
+"""
+State for incremental re-fills of an existing report.
+
+After a full run the state file next to the output records, per sheet, a fingerprint of every resolved
+row keyed by "Scheme Name", plus what is needed to re-apply column widths. On the next run the resolved
+sheets are compared against it: sheets whose rows are all unchanged are carried over from the previous
+output as they are, and sheets with the same schemes in the same order only get their changed rows
+rewritten. Anything else (new or removed schemes, a different legend, another "As on" date, a new
+template or mapping, or an output that was modified since) needs a full run.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import date, timedelta
+
+from helper import file_sha256
+from schema import mapping_fingerprint
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+
+def state_path(output_file):
+    return f"{output_file}.state.json"
+
+
+def _digest(value):
+    return hashlib.blake2b(repr(value).encode(), digest_size=16).hexdigest()
+
+
+def sheet_fingerprint(resolved):
+    """Fingerprints of one resolved sheet: its layout and legend, and (scheme, row fingerprint) per row."""
+    blocks = resolved['blocks']
+    scheme_block = next((block for block in blocks if block['header'] == "Scheme Name"), None)
+    rows = []
+    for offset in range(resolved['row_count']):
+        scheme = scheme_block['values'][offset] if scheme_block else offset
+        rows.append([str(scheme), _digest(tuple((block['values'][offset], block['is_older'][offset])
+                                                for block in blocks))])
+    layout = _digest((resolved['header_row'], resolved['row_count'],
+                      tuple((block['header'], block['dest_col'], block['fill']) for block in blocks),
+                      resolved['any_older_data_used'], resolved['older_month_id'], resolved['older_date_for_legend']))
+    return {'layout': layout, 'rows': rows}
+
+
+def _context(template_file, as_on=None):
+    """What the whole output depends on besides the raw data; as_on defaults to yesterday, as in main()."""
+    return {'version': STATE_VERSION, 'as_on': (as_on or date.today() - timedelta(days=1)).isoformat(),
+            'template_sha256': file_sha256(template_file), 'mapping': _digest(mapping_fingerprint())}
+
+
+def save_state(output_file, resolved_sheets, base_widths, template_file, as_on=None):
+    """Records the state of a report that was just written to output_file."""
+    state = dict(_context(template_file, as_on), output_sha256=file_sha256(output_file), sheets={
+        name: dict(sheet_fingerprint(resolved), base_widths=base_widths.get(name, {}))
+        for name, resolved in resolved_sheets.items()})
+    tmp_path = f"{state_path(output_file)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path(output_file))
+
+
+def load_state(output_file, template_file, as_on=None):
+    """The state of the previous report at output_file, or None when it cannot be refilled incrementally."""
+    if not isinstance(output_file, (str, os.PathLike)):
+        return None
+    try:
+        with open(state_path(output_file)) as f:
+            state = json.load(f)
+        output_sha256 = file_sha256(output_file)
+    except (OSError, ValueError):
+        return None
+    if any(state.get(key) != value for key, value in _context(template_file, as_on).items()):
+        logger.info("Previous report is as on another date or was made with another template/mapping.")
+        return None
+    if state.get('output_sha256') != output_sha256:
+        logger.info("Previous report was modified since it was written.")
+        return None
+    return state
+
+
+def plan_refill(state, resolved_sheets):
+    """
+    Rows to rewrite per sheet, {sheet_name: [row offsets]} (empty for unchanged sheets), or None when
+    a sheet changed shape and the report needs a full run.
+    """
+    if set(state['sheets']) != set(resolved_sheets):
+        return None
+    plan = {}
+    for name, resolved in resolved_sheets.items():
+        previous, current = state['sheets'][name], sheet_fingerprint(resolved)
+        if previous['layout'] != current['layout'] or \
+                [scheme for scheme, _ in previous['rows']] != [scheme for scheme, _ in current['rows']]:
+            logger.info(f"Sheet '{name}' changed shape; a full run is needed.")
+            return None
+        plan[name] = [offset for offset, (old, new) in enumerate(zip(previous['rows'], current['rows']))
+                      if old[1] != new[1]]
+    return plan
@@ -0,0 +1,185 @@
+"""
+Per-stage timing, counters and peak memory for a pipeline run.
+
+Instrumentation is ambient: wrap a run in ``RunReport().activate()`` and every ``stage``, ``count``
+and ``@instrumented`` function inside it records into that report. Outside an active report they
+do nothing beyond one context-variable lookup, so library calls and batch runs pay nothing for it.
+"""
+import functools
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+_active_report = ContextVar("active_report", default=None)
+
+
+def _new_stats():
+    return {'calls': 0, 'seconds': 0.0, 'peak_memory_kb': None}
+
+
+class RunReport:
+    """
+    Collects wall time, call counts and counters per stage, both overall and per sheet, plus the
+    peak traced memory (tracemalloc) of every stage and sheet when trace_memory is on.
+    tracemalloc is process wide, so peaks are only meaningful for one active run per process.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.started = None
+        self.seconds = None
+        self.peak_memory_kb = None
+        self.stages = {}
+        self.counters = {}
+        self.sheets = {}
+        self._sheet = None
+        self._peaks = []
+        self._owns_tracemalloc = False
+
+    # --- memory ---
+    def _push_peak(self):
+        if not self.trace_memory:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        if self._peaks:
+            # Keep the enclosing scope's peak before the inner scope resets it
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        tracemalloc.reset_peak()
+        self._peaks.append(current)
+
+    def _pop_peak(self):
+        if not self.trace_memory:
+            return None
+        peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        return peak // 1024
+
+    # --- recording ---
+    def _sheet_stats(self, sheet):
+        return self.sheets.setdefault(sheet, {'seconds': 0.0, 'peak_memory_kb': None, 'stages': {}, 'counters': {}})
+
+    @contextmanager
+    def activate(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        token = _active_report.set(self)
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self._push_peak()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.seconds = round(time.perf_counter() - start, 4)
+            self.peak_memory_kb = self._pop_peak()
+            _active_report.reset(token)
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+                self._owns_tracemalloc = False
+
+    @contextmanager
+    def sheet_scope(self, sheet):
+        previous, self._sheet = self._sheet, sheet
+        stats = self._sheet_stats(sheet)
+        self._push_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats['seconds'] = round(stats['seconds'] + time.perf_counter() - start, 4)
+            peak = self._pop_peak()
+            if peak is not None:
+                stats['peak_memory_kb'] = max(stats['peak_memory_kb'] or 0, peak)
+            self._sheet = previous
+
+    @contextmanager
+    def stage(self, name):
+        self._push_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = self._pop_peak()
+            targets = [self.stages.setdefault(name, _new_stats())]
+            if self._sheet is not None:
+                targets.append(self._sheet_stats(self._sheet)['stages'].setdefault(name, _new_stats()))
+            for stats in targets:
+                stats['calls'] += 1
+                stats['seconds'] += elapsed
+                if peak is not None:
+                    stats['peak_memory_kb'] = max(stats['peak_memory_kb'] or 0, peak)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        if self._sheet is not None:
+            counters = self._sheet_stats(self._sheet)['counters']
+            counters[name] = counters.get(name, 0) + value
+
+    # --- output ---
+    def to_dict(self):
+        def rounded(stages):
+            return {name: dict(stats, seconds=round(stats['seconds'], 4)) for name, stats in stages.items()}
+
+        return {'started': self.started, 'seconds': self.seconds, 'peak_memory_kb': self.peak_memory_kb,
+                'stages': rounded(self.stages), 'counters': dict(self.counters),
+                'sheets': {sheet: dict(stats, stages=rounded(stats['stages']))
+                           for sheet, stats in self.sheets.items()}}
+
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), indent=2, default=str)
+        if path:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+
+def current_report():
+    return _active_report.get()
+
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block as stage `name` of the active report, if any."""
+    report = _active_report.get()
+    if report is None:
+        yield
+    else:
+        with report.stage(name):
+            yield
+
+
+@contextmanager
+def sheet_scope(sheet):
+    """Attributes the stages and counters recorded in the enclosed block to `sheet`."""
+    report = _active_report.get()
+    if report is None:
+        yield
+    else:
+        with report.sheet_scope(sheet):
+            yield
+
+
+def count(name, value=1):
+    if (report := _active_report.get()) is not None:
+        report.count(name, value)
+
+
+def instrumented(func=None, name=None):
+    """Decorator recording every call of a function as a stage (named after the function by default)."""
+    if func is None:
+        return functools.partial(instrumented, name=name)
+    stage_name = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        report = _active_report.get()
+        if report is None:
+            return func(*args, **kwargs)
+        with report.stage(stage_name):
+            return func(*args, **kwargs)
+    return wrapper
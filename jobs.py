@@ -0,0 +1,179 @@
+"""
+Background processing of uploaded raw files for the web UI.
+
+A JobQueue runs the pipeline for every submitted upload in a bounded pool of worker processes, so a
+large file neither blocks the session that uploaded it nor the server's other sessions. The queue keeps
+a table of jobs that any session can poll by job id: status, the sheet being filled (reported by
+process_sheet as it goes), and the finished report or the error. Reports also go to the result cache,
+so a repeat upload is served at once, and an upload identical to a job still in the queue joins it.
+"""
+import io
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import template_file, SHEETS_TO_IGNORE, LOGO_FILENAME
+from instrumentation import RunReport
+from main import main
+from result_cache import result_key
+from template_cache import get_prepared_template, share_prepared_template
+
+logger = logging.getLogger(__name__)
+
+_events = None
+
+
+def _init_worker(prepared, events, log_level):
+    global _events
+    logging.basicConfig(level=log_level, format="%(message)s")
+    share_prepared_template(prepared)
+    _events = events
+
+
+def _run_job(job_id, raw_bytes, trace_memory):
+    """Runs the pipeline on one upload in a worker process; returns (report bytes, run report dict)."""
+    def progress(message, done, total):
+        _events.put((job_id, message, done, total))
+
+    progress("Reading the raw file", 0, None)
+    output = io.BytesIO()
+    report = RunReport(trace_memory=trace_memory)
+    try:
+        with report.activate():
+            main(raw_file=io.BytesIO(raw_bytes), output_file=output, SHEETS_TO_IGNORE=SHEETS_TO_IGNORE,
+                 LOGO_FILENAME=LOGO_FILENAME, progress=progress)
+    except SystemExit:
+        # main exits when a required file is missing; it has logged which one
+        raise RuntimeError("A required file is missing, see the server log.") from None
+    return output.getvalue(), report.to_dict()
+
+
+class JobQueue:
+    """
+    Jobs run by at most `workers` processes at a time. Finished jobs are forgotten `keep_seconds` after
+    they finish. Safe to share between Streamlit sessions (threads). A worker that dies (killed, out of
+    memory) fails the jobs it broke, and the pool is replaced so later jobs still run.
+    """
+
+    def __init__(self, workers=2, result_cache=None, keep_seconds=3600):
+        self.result_cache = result_cache
+        self.keep_seconds = keep_seconds
+        self.workers = workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")  # forking a threaded server is not safe
+        self._events = self._context.Queue()
+        self._pool = self._new_pool()
+        threading.Thread(target=self._listen, name="job-progress", daemon=True).start()
+
+    def submit(self, raw_bytes, trace_memory=False):
+        """Queues a raw file's bytes and returns the job id right away."""
+        key = result_key(raw_bytes, template_file)
+        now = time.time()
+        with self._lock:
+            self._forget_finished(now)
+            for job in self._jobs.values():
+                if job['key'] == key and job['status'] in ("queued", "running"):
+                    return job['id']
+            job_id = uuid.uuid4().hex
+            job = self._jobs[job_id] = {'id': job_id, 'key': key, 'status': "queued", 'message': "Waiting",
+                                        'done': 0, 'total': None, 'submitted': now, 'finished': None,
+                                        'cached': False, 'error': None, 'report': None, 'result': None}
+        if self.result_cache is not None and (file_bytes := self.result_cache.get(key)) is not None:
+            self._finish(job_id, file_bytes, cached=True)
+            return job_id
+        with self._lock:
+            pool = self._pool
+        try:
+            try:
+                future = pool.submit(_run_job, job_id, raw_bytes, trace_memory)
+            except BrokenProcessPool:
+                pool = self._replace_pool(pool)
+                future = pool.submit(_run_job, job_id, raw_bytes, trace_memory)
+        except Exception as e:
+            self._fail(job_id, e)
+            return job_id
+        future.add_done_callback(lambda f: self._on_done(job_id, f, pool))
+        logger.info(f"Queued job {job_id}")
+        return job_id
+
+    def status(self, job_id):
+        """
+        A copy of the job without its report bytes, with 'position' (jobs queued ahead of it) and
+        'fraction' (0 to 1) added, or None for an unknown or forgotten job.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            position = sum(1 for other in self._jobs.values()
+                           if other['status'] == "queued" and other['submitted'] < job['submitted'])
+            status = {name: value for name, value in job.items() if name != 'result'}
+        status['position'] = position if job['status'] == "queued" else 0
+        status['fraction'] = 1.0 if job['status'] == "done" else job['done'] / job['total'] if job['total'] else 0.0
+        return status
+
+    def result(self, job_id):
+        """The report bytes of a finished job, else None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job and job['result']
+
+    def shutdown(self):
+        with self._lock:
+            pool = self._pool
+        pool.shutdown(cancel_futures=True)
+        self._events.put(None)
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context, initializer=_init_worker,
+                                   initargs=(get_prepared_template(template_file, SHEETS_TO_IGNORE), self._events,
+                                             logging.getLogger().level))
+
+    def _replace_pool(self, broken):
+        """Swaps a fresh pool in for `broken` unless another thread already has; returns the current pool."""
+        with self._lock:
+            if self._pool is broken:
+                logger.warning("A worker process died; starting a new pool.")
+                self._pool = self._new_pool()
+            pool = self._pool
+        broken.shutdown(wait=False, cancel_futures=True)
+        return pool
+
+    def _listen(self):
+        while (event := self._events.get()) is not None:
+            job_id, message, done, total = event
+            with self._lock:
+                if (job := self._jobs.get(job_id)) is not None and job['status'] in ("queued", "running"):
+                    job.update(status="running", message=message, done=done, total=total)
+
+    def _on_done(self, job_id, future, pool):
+        try:
+            file_bytes, report = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._replace_pool(pool)
+            self._fail(job_id, e)
+            return
+        if self.result_cache is not None:
+            self.result_cache.put(self._jobs[job_id]['key'], file_bytes)
+        self._finish(job_id, file_bytes, report=report)
+
+    def _fail(self, job_id, error):
+        logger.error(f"Job {job_id} failed: {type(error).__name__}: {error}")
+        with self._lock:
+            self._jobs[job_id].update(status="failed", message="Failed", error=str(error), finished=time.time())
+
+    def _finish(self, job_id, file_bytes, cached=False, report=None):
+        with self._lock:
+            self._jobs[job_id].update(status="done", message="Done", result=file_bytes, cached=cached,
+                                      report=report, finished=time.time())
+
+    def _forget_finished(self, now):
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job['finished'] is not None and now - job['finished'] > self.keep_seconds]:
+            del self._jobs[job_id]
@@ -1,20 +1,27 @@
+import os
 import openpyxl
-import tempfile
-import streamlit as st
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 import sys
+import logging
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
 from openpyxl.drawing.image import Image
 from openpyxl.utils import get_column_letter
-from config import RAW_TO_TEMPLATE_HEADER_MAP, MONTH_GROUPED_HEADERS, LOGO_FILENAME, raw_file, \
-    template_file, output_file, RATING_HEADERS, SHEETS_TO_IGNORE
-from helper import update_as_on_date, find_header_row, get_month_id_for_column, is_date_like, \
-    get_parent_header_for_column, is_meaningful_data
+from config import template_file, RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES, JOB_WORKERS, JOB_KEEP_SECONDS
+# Only the processing core is imported here: streamlit, the job queue, the result cache and the history
+# store are imported where they are used, so batch runs and scripts do not pay for them
+from helper import update_as_on_date, find_benchmark_row
+from resolve import resolve_raw_sheets
+from instrumentation import instrumented, stage, sheet_scope, count
+from template_cache import get_prepared_template
+from xlsx_patch import save_patched, load_sheets
+from incremental import load_state, plan_refill, save_state
+from styling import CellStyles
+from compare import resolve_with_baselines, baseline_labels, write_comparisons
 
 
 
-today_str = datetime.now().strftime("%d-%B-%Y")
+logger = logging.getLogger(__name__)
 
 # --- GLOBAL STYLES ---
 light_brown_fill = PatternFill(start_color="DCC7A3", end_color="DCC7A3", fill_type="solid")
@@ -25,10 +32,19 @@ center_align = Alignment(horizontal='center', vertical='center', wrap_text=True)
 thin_border_side = Side(border_style="thin", color="000000")
 button_border = Border(left=thin_border_side, right=thin_border_side, top=thin_border_side, bottom=thin_border_side)
 
+# Style bundles of the data sheets, registered once per workbook (see styling.CellStyles)
+REPORT_STYLES = {
+    'older_data': {'fill': light_brown_fill},
+    'normal': {'fill': no_fill},
+    'back_button': {'font': back_button_font, 'fill': back_button_fill, 'alignment': center_align,
+                    'border': button_border},
+}
 
 
-def create_styled_homepage(workbook,SHEETS_TO_IGNORE,LOGO_FILENAME):
-    print("Creating precise styled homepage...")
+
+@instrumented
+def create_styled_homepage(workbook,SHEETS_TO_IGNORE,LOGO_FILENAME,as_on=None):
+    logger.info("Creating precise styled homepage...")
     if 'Home' in workbook.sheetnames :
         home_sheet = workbook['Home']
         home_sheet.delete_rows(1, home_sheet.max_row + 1)
@@ -46,6 +62,12 @@ def create_styled_homepage(workbook,SHEETS_TO_IGNORE,LOGO_FILENAME):
     heading_fill = PatternFill(start_color="D1B27B", end_color="D1B27B", fill_type="solid")
     button_fill_ui = PatternFill(start_color="DCC783", end_color="DCC783", fill_type="solid")
     right_align = Alignment(horizontal='right', vertical='center')
+    styles = CellStyles.of(workbook, {
+        'heading': {'font': title_font, 'fill': heading_fill, 'alignment': center_align},
+        'frame': {'border': button_border},
+        'button': {'fill': button_fill_ui, 'border': button_border},
+        'button_label': {'font': button_font_ui, 'alignment': center_align},
+    })
     img = None
     try:
         img = Image(LOGO_FILENAME)
@@ -59,30 +81,26 @@ def create_styled_homepage(workbook,SHEETS_TO_IGNORE,LOGO_FILENAME):
         text_cell.value = "RIA : INA000018249"
         text_cell.font = Font(bold=True)
     except FileNotFoundError:
-        print(f" WARNING: Logo file '{LOGO_FILENAME}' not found.")
+        logger.warning(f" WARNING: Logo file '{LOGO_FILENAME}' not found.")
 
     home_sheet.merge_cells('H1:L2')
     title_cell = home_sheet['H1']
     title_cell.value = "Daily Debt MF Tracker"
-    title_cell.font = title_font
-    title_cell.fill = heading_fill
-    title_cell.alignment = center_align
-    for row in home_sheet['H1:L2']:
-        for cell in row: cell.border = button_border
+    styles.apply((title_cell,), 'heading')
+    styles.apply_range(home_sheet, 'H1:L2', 'frame')
 
     date_cell = home_sheet['O2']
-    date_cell.value = datetime.today().strftime('%d-%b-%y')
+    # The report is published the day after the date it is as on
+    report_day = as_on + timedelta(days=1) if as_on else datetime.today()
+    date_cell.value = report_day.strftime('%d-%b-%y')
     date_cell.font = date_font
     date_cell.alignment = right_align
 
     home_sheet.merge_cells('E4:O5')
     debt_funds_cell = home_sheet['E4']
     debt_funds_cell.value = "Debt Funds"
-    debt_funds_cell.font = title_font
-    debt_funds_cell.fill = heading_fill
-    debt_funds_cell.alignment = center_align
-    for row in home_sheet['E4:O5']:
-        for cell in row: cell.border = button_border
+    styles.apply((debt_funds_cell,), 'heading')
+    styles.apply_range(home_sheet, 'E4:O5', 'frame')
 
     data_sheets = sorted([s for s in workbook.sheetnames if s not in SHEETS_TO_IGNORE and s.strip().lower() != 'disclaimer'])
     start_row, start_col, max_cols = 7, 5, 4
@@ -96,40 +114,48 @@ def create_styled_homepage(workbook,SHEETS_TO_IGNORE,LOGO_FILENAME):
                                end_column=cell_col + button_width - 1)
         button_cell = home_sheet.cell(row=cell_row, column=cell_col)
         button_cell.value = sheet_name
-        button_cell.alignment = center_align
-        for r_offset in range(button_height):
-            for c_offset in range(button_width):
-                cell_to_style = home_sheet.cell(row=cell_row + r_offset, column=cell_col + c_offset)
-                cell_to_style.fill = button_fill_ui
-                cell_to_style.border = button_border
+        styles.apply((home_sheet.cell(row=cell_row + r_offset, column=cell_col + c_offset)
+                      for r_offset in range(button_height) for c_offset in range(button_width)), 'button')
+        styles.apply((button_cell,), 'button_label')
         button_cell.hyperlink = f"#'{sheet_name}'!A1"
-        button_cell.font = button_font_ui
 
     home_sheet.sheet_view.showGridLines = False
     if img: home_sheet.column_dimensions['A'].width = (img.width / 7)
     for i in range(2, 20): home_sheet.column_dimensions[get_column_letter(i)].width = 12
-    print("Styled homepage created successfully.")
+    logger.info("Styled homepage created successfully.")
 
 
-def auto_fit_columns(sheet):
+def measure_column_widths(sheet):
     """
-    Adjusts the column width of a sheet to fit the longest content in each column.
+    Returns the longest content length (plus padding) found in each column of a sheet, keyed by column index.
     """
     column_widths = {}
     for row in sheet.iter_rows():
         for cell in row:
-            if cell.value:
-                cell_len = len(str(cell.value)) + 2
-                # Storing the maximum length found for this column
-                if cell.column_letter not in column_widths or cell_len > column_widths[cell.column_letter]:
-                    column_widths[cell.column_letter] = cell_len
+            track_column_width(column_widths, cell.column, cell.value)
+    return column_widths
+
+
+def track_column_width(column_widths, column, value):
+    """
+    Updates the running maximum width of a column with a value written to it.
+    """
+    if value:
+        cell_len = len(str(value)) + 2
+        # Storing the maximum length found for this column
+        if cell_len > column_widths.get(column, 0):
+            column_widths[column] = cell_len
+
 
-    for col_letter, width in column_widths.items():
-        sheet.column_dimensions[col_letter].width = min(width, 22)
-        
+def apply_column_widths(sheet, column_widths, max_width=22):
+    for col, width in column_widths.items():
+        sheet.column_dimensions[get_column_letter(col)].width = min(width, max_width)
 
+
+@instrumented
 def format_and_legend(template_sheet, data_header_row_template, start_row_template, rows_on_this_sheet, aum_dest_col,
                       any_older_data_used,older_date_for_legend,older_month_id):
+    styles = CellStyles.of(template_sheet.parent, REPORT_STYLES)
     if aum_dest_col:
         try:
             template_sheet.merge_cells(start_row=data_header_row_template - 2, end_row=data_header_row_template - 1,
@@ -139,14 +165,14 @@ def format_and_legend(template_sheet, data_header_row_template, start_row_templa
             corpus_cell.alignment = center_align
             template_sheet.cell(row=data_header_row_template, column=aum_dest_col).value = "AUM (Cr.)"
         except Exception as e:
-            print(f" Warning: could not merge Corpus header: {e}")
+            logger.warning(f" Warning: could not merge Corpus header: {e}")
 
     if any_older_data_used:
         older_date_str = older_date_for_legend.strftime('%d-%b-%Y') if older_date_for_legend else (
                 older_month_id and datetime.strptime(str(older_month_id), "%Y%m").strftime("%b-%Y"))
         if older_date_str:
             legend_row = start_row_template + rows_on_this_sheet + 2
-            template_sheet.cell(row=legend_row, column=1).fill = light_brown_fill
+            styles.apply((template_sheet.cell(row=legend_row, column=1),), 'older_data')
             template_sheet.column_dimensions['A'].width = 5
             template_sheet.cell(row=legend_row, column=2).value = f"Indicates data as of {older_date_str}"
             template_sheet.cell(row=legend_row, column=2).font = Font(bold=True)
@@ -155,20 +181,19 @@ def format_and_legend(template_sheet, data_header_row_template, start_row_templa
     back_button = template_sheet['A2']
     back_button.value = "Home"
     back_button.hyperlink = f"#'Home'!A1"
-    back_button.font = back_button_font
-    back_button.fill = back_button_fill
-    back_button.alignment = center_align
-    back_button.border = button_border
+    styles.apply((back_button,), 'back_button')
     template_sheet.column_dimensions['A'].width = 50
 
 
-def remove_benchmark(template_sheet,data_header_row_template):
+@instrumented
+def remove_benchmark(template_sheet,data_header_row_template,benchmark_row=None):
 
     # --- TEMPLATE SHEET ---
-    if (benchmark_row := next((r for r in range(1, template_sheet.max_row + 2) if
-                               str(template_sheet.cell(row=r, column=1).value).strip().lower() == "benchmark"), None)):
+    if benchmark_row is None:
+        benchmark_row = find_benchmark_row(template_sheet)
+    if benchmark_row != -1:
         template_sheet.delete_rows(benchmark_row, template_sheet.max_row - benchmark_row + 2)
-        print("    Benchmark table removed.")
+        logger.info("    Benchmark table removed.")
     clear_from = data_header_row_template + 1
     if template_sheet.max_row >= clear_from:
         for row in template_sheet.iter_rows(min_row=clear_from):
@@ -176,266 +201,266 @@ def remove_benchmark(template_sheet,data_header_row_template):
             for cell in row: cell.value = None
 
 
-def process_sheet(raw_wb, template_wb, SHEETS_TO_IGNORE):
+@instrumented
+def process_sheet(resolved_sheets, template_wb, SHEETS_TO_IGNORE, layouts, base_widths=None, as_on=None, progress=None):
 
     total_rows_written = 0
-    for sheet_name in raw_wb.sheetnames:
-        if sheet_name in SHEETS_TO_IGNORE: continue
-        print(f"--- Processing sheet: '{sheet_name}' ---")
-        raw_sheet = raw_wb[sheet_name]
+    modified_sheets = []
+    sheet_names = [name for name in resolved_sheets if name not in SHEETS_TO_IGNORE]
+    for done, sheet_name in enumerate(sheet_names):
+        resolved = resolved_sheets[sheet_name]
+        logger.info(f"--- Processing sheet: '{sheet_name}' ---")
+        if progress:
+            # One more step for the save, reported by main
+            progress(f"Filling '{sheet_name}'", done, len(sheet_names) + 1)
         if sheet_name not in template_wb.sheetnames:
-            print(f"WARNING: Sheet '{sheet_name}' not found in template file. Skipping.")
+            logger.warning(f"WARNING: Sheet '{sheet_name}' not found in template file. Skipping.")
             continue
         template_sheet = template_wb[sheet_name]
 
-        update_as_on_date(template_sheet)
-        data_header_row_raw = find_header_row(raw_sheet)
-        if data_header_row_raw == -1:
-            continue
-        data_header_row_template = find_header_row(template_sheet)
-        if data_header_row_template == -1:
-            continue
-        # --- SOURCE COLUMNS ---
-        header_row_str = str(data_header_row_raw)
-        # Hardcode the latest AUM to column C and the older AUM to column B.
-        latest_aum_col_raw = 3  # Column C
-        older_aum_col_raw = 2  # Column B
-        # Get the date for the legend directly from the known cell B12.
-        older_date_for_legend = raw_sheet['B' + header_row_str].value
-
-        raw_col_map = {c: {'header': str(cell.value).strip() if cell.value else "",
-                           'month_id': get_month_id_for_column(raw_sheet, data_header_row_raw, c)} for c, cell in
-                       enumerate(raw_sheet[data_header_row_raw], 1)}
-        all_month_ids = sorted(list(set(v['month_id'] for v in raw_col_map.values() if v['month_id'] is not None)),
-                               reverse=True)
-        latest_month_id = all_month_ids[0] if all_month_ids else None
-        older_month_id = all_month_ids[1] if len(all_month_ids) > 1 else None
-
-        raw_date_columns_by_parent = {}
-        for col, cell in enumerate(raw_sheet[data_header_row_raw], 1):
-            if date_v := is_date_like(cell.value):
-                parent = get_parent_header_for_column(raw_sheet, data_header_row_raw, col) or "(unknown parent)"
-                raw_date_columns_by_parent.setdefault(parent, []).append((col, date_v))
-        for p, lst in raw_date_columns_by_parent.items():
-            raw_date_columns_by_parent[p] = sorted(lst, key=lambda t: t[1], reverse=True)
-
-        dest_col_map = {str(c.value).strip(): c.column for c in template_sheet[data_header_row_template] if c.value}
-        aum_dest_col = next(
-            (c.column for r in range(data_header_row_template - 2, data_header_row_template + 1) for c in
-             template_sheet[r] if "AUM" in str(c.value)), None)
-
-        remove_benchmark(template_sheet,data_header_row_template)
-
-        # --- DESTINATION COLUMNS ---
-        # --- WRITING DATA ROW BY ROW ---
-        start_row_template = data_header_row_template + 1
-        rows_on_this_sheet = 0
-        any_older_data_used = False
-        exp_dates = next((v for k, v in raw_date_columns_by_parent.items() if 'expense' in k.lower()), [])
-
-        for row_num in range(data_header_row_raw + 1, raw_sheet.max_row + 2):
-            if not raw_sheet.cell(row=row_num, column=1).value: break
-            template_row_index = start_row_template + rows_on_this_sheet
-
-
-            handling_standard_column(dest_col_map, raw_col_map, raw_sheet, row_num, latest_month_id, older_month_id,any_older_data_used,
-                                     template_sheet, template_row_index)
-
-            handling_rating_allocation(raw_col_map,latest_month_id,raw_sheet,row_num,dest_col_map,older_month_id,
-                                       any_older_data_used ,template_sheet,template_row_index)
-
-            handling_AUM(aum_dest_col,latest_aum_col_raw,older_aum_col_raw,raw_sheet,row_num,template_sheet,template_row_index)
-
-            handle_expense_ration(exp_dates,dest_col_map,raw_sheet,row_num,template_sheet,template_row_index)
-
-            total_rows_written += 1
-            rows_on_this_sheet += 1
-        print(f" Wrote {rows_on_this_sheet} rows of new data.")
-        print(f"\nTotal rows written across all sheets: {total_rows_written}")
-
-        # --- FORMAT & LEGEND ---
-        format_and_legend(template_sheet, data_header_row_template, start_row_template, rows_on_this_sheet, aum_dest_col,
-                      any_older_data_used,older_date_for_legend,older_month_id)
-
-def handling_standard_column(dest_col_map,raw_col_map,raw_sheet,row_num,latest_month_id,older_month_id,any_older_data_used,
-                             template_sheet,template_row_index):
-
-    auto_fit_columns(template_sheet)
-    for raw_h, tpl_h in RAW_TO_TEMPLATE_HEADER_MAP.items():
-        if tpl_h in dest_col_map and tpl_h not in ["AAA", "AA / AA+ / AA-", "A / A+ / A1+ / A1-", "D", "Unrated",
-                                                   "Cash & Equivalent", "Others", "SOV"]:
-            dest_col = dest_col_map[tpl_h]
-            final_value, is_older = None, False
-            latest_col = next(
-                (c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] == latest_month_id),
-                None)
-            older_col = next(
-                (c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] == older_month_id),
-                None)
-            static_col = next((c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] is None),
-                              None)
-
-            if latest_col:
-                latest_val = raw_sheet.cell(row=row_num, column=latest_col).value
-                if is_meaningful_data(latest_val):
-                    final_value = latest_val
-
-            if final_value is None and older_col:
-                older_val = raw_sheet.cell(row=row_num, column=older_col).value
-                if is_meaningful_data(older_val):
-                    final_value = older_val
-                    is_older = True
-                    any_older_data_used = True
-
-            if final_value is None and static_col:
-                final_value = raw_sheet.cell(row=row_num, column=static_col).value
-
-            dest_cell = template_sheet.cell(row=template_row_index, column=dest_col)
-            dest_cell.value = final_value
-            if tpl_h in MONTH_GROUPED_HEADERS:
-                dest_cell.fill = light_brown_fill if is_older else no_fill
-
-
-def handling_rating_allocation(raw_col_map,latest_month_id,raw_sheet,row_num,dest_col_map,older_month_id,
-                               any_older_data_used ,template_sheet,template_row_index):
-# A2) Handle rating allocation block (special rule)
-# Step 1: check if latest has *any* rating filled
-    latest_has_any = False
-    latest_vals = {}
-    for raw_h in RATING_HEADERS:
-        latest_col = next(
-            (c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] == latest_month_id), None)
-        if latest_col:
-            val = raw_sheet.cell(row=row_num, column=latest_col).value
-            if is_meaningful_data(val):
-                latest_has_any = True
-            latest_vals[raw_h] = val
-
-    # Step 2: choose source (latest vs older)
-    use_latest = latest_has_any
-    for raw_h in RATING_HEADERS:
-        tpl_h = raw_h
-        if tpl_h not in dest_col_map:
+        modified_sheets.append(sheet_name)
+        with sheet_scope(sheet_name):
+            layout = layouts.get(sheet_name)
+            update_as_on_date(template_sheet, layout and layout['as_on_cell'], as_on)
+            if resolved['header_row'] == -1:
+                continue
+            if layout is None:
+                continue
+            data_header_row_template = layout['header_row']
+            aum_dest_col = layout['aum_dest_col']
+
+            remove_benchmark(template_sheet,data_header_row_template,layout['benchmark_row'])
+
+            # --- WRITING DATA ---
+            start_row_template = data_header_row_template + 1
+            rows_on_this_sheet = resolved['row_count']
+            # Widths of what is left on the sheet, kept up to date as rows are written and applied once at the end
+            column_widths = measure_column_widths(template_sheet)
+            if base_widths is not None:
+                base_widths[sheet_name] = dict(column_widths)
+            write_resolved_columns(template_sheet, resolved['blocks'], start_row_template, column_widths)
+            total_rows_written += rows_on_this_sheet
+            if rows_on_this_sheet:
+                apply_column_widths(template_sheet, column_widths)
+            count('rows_written', rows_on_this_sheet)
+            count('older_fallbacks', sum(sum(block['is_older']) for block in resolved['blocks'] if block['fill']))
+            logger.info(f" Wrote {rows_on_this_sheet} rows of new data.")
+            logger.info(f"Total rows written across all sheets: {total_rows_written}")
+
+            # --- FORMAT & LEGEND ---
+            format_and_legend(template_sheet, data_header_row_template, start_row_template, rows_on_this_sheet,
+                              aum_dest_col, resolved['any_older_data_used'], resolved['older_date_for_legend'],
+                              resolved['older_month_id'])
+    return modified_sheets
+
+
+@instrumented
+def write_resolved_columns(template_sheet, blocks, start_row_template, column_widths, offsets=None):
+    """
+    Writes resolved column blocks below the template header, filling the cells that came from the
+    older month (for blocks that carry a fill) and keeping the running column widths up to date.
+    With offsets, only those rows of the blocks are written. Only the last block written to a column counts
+    for its width, as the earlier ones are overwritten.
+    """
+    styles = CellStyles.of(template_sheet.parent, REPORT_STYLES)
+    restyled = 0
+    last_blocks = {block['dest_col']: block for block in blocks}
+    for block in blocks:
+        dest_col = block['dest_col']
+        is_last = last_blocks[dest_col] is block
+        older_cells, normal_cells = [], []
+        for offset in range(len(block['values'])) if offsets is None else offsets:
+            value = block['values'][offset]
+            dest_cell = template_sheet.cell(row=start_row_template + offset, column=dest_col)
+            dest_cell.value = value
+            if is_last:
+                track_column_width(column_widths, dest_col, value)
+            if block['fill']:
+                (older_cells if block['is_older'][offset] else normal_cells).append(dest_cell)
+        restyled += styles.apply(older_cells, 'older_data') + styles.apply(normal_cells, 'normal')
+    count('cells_restyled', restyled)
+
+
+@instrumented
+def refill_sheets(report_wb, resolved_sheets, layouts, plan, state):
+    """
+    Rewrites only the changed rows of a previous report (plan comes from incremental.plan_refill) and
+    returns the sheets that were modified. Unchanged sheets are left exactly as they are.
+    """
+    modified_sheets = []
+    for sheet_name, offsets in plan.items():
+        if not offsets or sheet_name not in report_wb.sheetnames or (layout := layouts.get(sheet_name)) is None:
             continue
-        dest_col = dest_col_map[tpl_h]
-
-        if use_latest:
-            final_val = latest_vals.get(raw_h)
-            is_older = False
+        resolved = resolved_sheets[sheet_name]
+        report_sheet = report_wb[sheet_name]
+        modified_sheets.append(sheet_name)
+        with sheet_scope(sheet_name):
+            # Widths are those of a full run: the template's leftovers plus every value left on the sheet
+            column_widths = {int(col): width for col, width in state['sheets'][sheet_name]['base_widths'].items()}
+            for block in {block['dest_col']: block for block in resolved['blocks']}.values():
+                for value in block['values']:
+                    track_column_width(column_widths, block['dest_col'], value)
+            write_resolved_columns(report_sheet, resolved['blocks'], layout['header_row'] + 1, column_widths, offsets)
+            column_widths.pop(1, None)  # column A is sized by format_and_legend
+            apply_column_widths(report_sheet, column_widths)
+            count('rows_written', len(offsets))
+            logger.info(f" Rewrote {len(offsets)} changed row(s) of '{sheet_name}'.")
+    return modified_sheets
+
+
+def refill_report(output_file, resolved_sheets, layouts, plan, state, writer="openpyxl", as_on=None):
+    """Applies an incremental plan to the previous report at output_file, in place."""
+    with stage('load_previous'):
+        if writer == "patch":
+            # Unchanged sheets are copied from the previous report by save_patched, so only parse the others
+            report_wb = load_sheets(output_file, [name for name, offsets in plan.items() if offsets])
         else:
-            older_col = next(
-                (c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] == older_month_id),
-                None)
-            final_val, is_older = None, False
-            if older_col:
-                val = raw_sheet.cell(row=row_num, column=older_col).value
-                if is_meaningful_data(val):
-                    final_val = val
-                    is_older = True
-                    any_older_data_used = True
-
-
-        dest_cell = template_sheet.cell(row=template_row_index, column=dest_col)
-        dest_cell.value = final_val
-        dest_cell.fill = light_brown_fill if is_older else no_fill
-
-def handling_AUM(aum_dest_col,latest_aum_col_raw,older_aum_col_raw,raw_sheet,row_num,template_sheet,template_row_index):
-# B) AUM
-    if aum_dest_col:
-        aum_value, aum_is_older = None, False
-
-        # Check Latest
-        if latest_aum_col_raw:
-            val = raw_sheet.cell(row=row_num, column=latest_aum_col_raw).value
-            if is_meaningful_data(val):
-                aum_value = val
-
-        # Check Older (if needed)
-        if aum_value is None:
-
-            if older_aum_col_raw:
-                val = raw_sheet.cell(row=row_num, column=older_aum_col_raw).value
-                print(f"        > LATEST was empty. Checking OLDER AUM (col {older_aum_col_raw})... Found: '{val}'")
-
-                print(latest_aum_col_raw)
-                print(older_aum_col_raw)
-                if is_meaningful_data(val):
-                    aum_value = val
-                    aum_is_older = True
-                    any_older_data_used = True
-
-        dest_cell = template_sheet.cell(row=template_row_index, column=aum_dest_col)
-        dest_cell.value = aum_value
-        dest_cell.fill = light_brown_fill if aum_is_older else no_fill
-
-def handle_expense_ration(exp_dates,dest_col_map,raw_sheet,row_num,template_sheet,template_row_index):
-# C) Historical Expense Ratio
-
-    if exp_dates and (dest_col := dest_col_map.get("Direct Expense Ratio")):
-        her_value, her_is_older = None, False
-        if (val := raw_sheet.cell(row=row_num, column=exp_dates[0][0]).value) is not None and str(
-                val).strip() != "":
-            her_value = val
-        if her_value is None and len(exp_dates) > 1 and (
-        val := raw_sheet.cell(row=row_num, column=exp_dates[1][0]).value) is not None and str(val).strip() != "":
-            her_value = val
-            her_is_older = True
-            any_older_data_used = True
-
-        dest_cell = template_sheet.cell(row=template_row_index, column=dest_col)
-        dest_cell.value = her_value
-        dest_cell.fill = light_brown_fill if her_is_older else no_fill
+            report_wb = openpyxl.load_workbook(output_file)
+    modified_sheets = refill_sheets(report_wb, resolved_sheets, layouts, plan, state)
+    if not modified_sheets:
+        logger.info(f"Raw data unchanged since the last run; '{output_file}' is up to date.")
+        return output_file
+    with stage('save'):
+        if writer == "patch":
+            # The previous report is the package being patched, so write next to it and swap
+            tmp_path = f"{output_file}.tmp"
+            save_patched(report_wb, output_file, tmp_path, modified_sheets)
+            os.replace(tmp_path, output_file)
+        else:
+            report_wb.save(output_file)
+    save_state(output_file, resolved_sheets, {name: sheet['base_widths'] for name, sheet in state['sheets'].items()},
+               template_file, as_on)
+    logger.info(f"Success! Rewrote {len(modified_sheets)} sheet(s) of {output_file}")
+    return output_file
+
+def record_history(history_db, resolved_sheets):
+    """
+    Stores the run's values in the history database (see history.py). Called once the report is saved,
+    so a locked or broken database only costs the history, not the report.
+    """
+    import sqlite3
+    from history import HistoryStore
+    try:
+        with HistoryStore(history_db) as store:
+            logger.info(f"Stored {store.record_run(resolved_sheets)} values in {history_db}")
+    except sqlite3.Error as e:
+        logger.error(f"ERROR: Could not store the values in {history_db}: {e}")
 
 # --- MAIN SCRIPT ---
-def main(raw_file,output_file,SHEETS_TO_IGNORE,LOGO_FILENAME):
+def main(raw_file,output_file,SHEETS_TO_IGNORE,LOGO_FILENAME,workers=1,writer="openpyxl",as_on=None,incremental=False,
+         history_db=None,progress=None,compare_with=()):
+    # progress, if given, is called as progress(message, done, total) while the sheets are filled.
+    # compare_with: earlier raw files; every sheet gets delta columns against each of them (see compare.py)
 
-    print("Starting Data Transfer")
+    logger.info("Starting Data Transfer")
     try:
-        raw_wb = openpyxl.load_workbook(raw_file, data_only=True)
-        template_wb = openpyxl.load_workbook(template_file)
+        with stage('load_template'):
+            prepared = get_prepared_template(template_file, SHEETS_TO_IGNORE)
+            layouts = prepared.layouts
+        if compare_with:
+            resolved_sheets, baselines = resolve_with_baselines(raw_file, compare_with, layouts, SHEETS_TO_IGNORE,
+                                                                workers)
+        else:
+            resolved_sheets = resolve_raw_sheets(raw_file, layouts, SHEETS_TO_IGNORE, workers)
     except FileNotFoundError as e:
-        print(f"ERROR: Could not find a required file: {e.filename}")
+        logger.error(f"ERROR: Could not find a required file: {e.filename}")
         sys.exit()
 
-    process_sheet(raw_wb,template_wb,SHEETS_TO_IGNORE)
-
-    print("Processing and writing data one sheet at a time")
-    create_styled_homepage(template_wb,SHEETS_TO_IGNORE,LOGO_FILENAME)
+    if incremental and compare_with:
+        # The state does not cover the delta columns, so comparison runs always fill the whole report
+        logger.info("Comparison runs fill the whole report; --incremental is ignored.")
+        incremental = False
+    if incremental and (state := load_state(output_file, template_file, as_on)) is not None and \
+            (plan := plan_refill(state, resolved_sheets)) is not None:
+        refill_report(output_file, resolved_sheets, layouts, plan, state, writer, as_on)
+        if history_db:
+            record_history(history_db, resolved_sheets)
+        return output_file
+
+    with stage('copy_template'):
+        template_wb = prepared.workbook()
+    base_widths = {}
+    modified_sheets = process_sheet(resolved_sheets,template_wb,SHEETS_TO_IGNORE,layouts,base_widths,as_on,progress)
+    if compare_with:
+        write_comparisons(template_wb, resolved_sheets, baselines, baseline_labels(compare_with, baselines), layouts,
+                          SHEETS_TO_IGNORE)
+
+    logger.info("Processing and writing data one sheet at a time")
+    create_styled_homepage(template_wb,SHEETS_TO_IGNORE,LOGO_FILENAME,as_on)
+    modified_sheets.append('Home')
 
     disclaimer_sheet_name = next((s for s in template_wb.sheetnames if s.strip().lower() == 'disclaimer'), None)
 
     if disclaimer_sheet_name:
         disclaimer_sheet = template_wb[disclaimer_sheet_name]
         disclaimer_sheet.sheet_view.showGridLines = False
-        print("Hid gridlines on the Disclaimer sheet.")
-
-    template_wb.save(output_file)
-    print(f"Success! Data transferred and saved to {output_file}")
+        modified_sheets.append(disclaimer_sheet_name)
+        logger.info("Hid gridlines on the Disclaimer sheet.")
+
+    if progress:
+        sheet_count = sum(1 for name in resolved_sheets if name not in SHEETS_TO_IGNORE)
+        progress("Saving the report", sheet_count, sheet_count + 1)
+    with stage('save'):
+        if writer == "patch":
+            save_patched(template_wb, template_file, output_file, modified_sheets)
+        else:
+            template_wb.save(output_file)
+    if incremental:
+        save_state(output_file, resolved_sheets, base_widths, template_file, as_on)
+    logger.info(f"Success! Data transferred and saved to {output_file}")
+    if history_db:
+        record_history(history_db, resolved_sheets)
     return output_file
 
-# if __name__ == "__main__":
-#     main(raw_file,SHEETS_TO_IGNORE,LOGO_FILENAME)
-
-
 if __name__ == "__main__":
+    import streamlit as st
+    from result_cache import ResultCache
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    today_str = datetime.now().strftime("%d-%B-%Y")
     st.title("Excel Data Transfer Tool")
     st.write("This tool transfers data from a raw Excel file to a formatted template Excel file.")
     uploaded_file = st.file_uploader("Upload Raw Excel File", type=["xlsx"])
-
-    if uploaded_file:
-        if st.button("process file"):
-            with st.spinner("Processing the Excel ... , Please wait "):
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_output:
-                    main(raw_file=uploaded_file,output_file=tmp_output.name,SHEETS_TO_IGNORE=SHEETS_TO_IGNORE,LOGO_FILENAME=LOGO_FILENAME)
-                    with open(tmp_output.name, "rb") as f:
-                        file_bytes=f.read()
-                        st.success("Processing Completed!")
-                        st.download_button(
-                            label="Download Processed Excel",
-                            data=file_bytes,
-                            file_name=f"Daily Performance Report {today_str}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+    show_report = st.checkbox("Show run report (timings and memory per sheet)")
+
+    @st.cache_resource
+    def get_job_queue():
+        # One queue, worker pool and result cache shared by every session of this server process
+        from jobs import JobQueue
+        return JobQueue(JOB_WORKERS, ResultCache(RESULT_CACHE_DIR, disk_max_bytes=RESULT_CACHE_MAX_BYTES),
+                        JOB_KEEP_SECONDS)
+
+    job_queue = get_job_queue()
+    if uploaded_file and st.button("process file"):
+        # Returns at once; the page below polls the job until it is done
+        st.session_state['job_id'] = job_queue.submit(uploaded_file.getvalue(), trace_memory=show_report)
+
+    if job_id := st.session_state.get('job_id'):
+        job = job_queue.status(job_id)
+        if job is None:
+            del st.session_state['job_id']
+            st.warning("This job is no longer available; please process the file again.")
+        elif job['status'] in ("queued", "running"):
+            waiting = job['status'] == "queued" and job['position']
+            st.progress(job['fraction'], text=f"Waiting for a free worker ({job['position']} job(s) ahead)"
+                        if waiting else f"{job['message']} ...")
+            time.sleep(1)
+            st.rerun()
+        elif job['status'] == "failed":
+            st.error(f"Processing failed: {job['error']}")
+        else:
+            if job['cached']:
+                st.info("This file was already processed today with the same template; serving the saved report.")
+            st.success("Processing Completed!")
+            st.download_button(
+                label="Download Processed Excel",
+                data=job_queue.result(job_id),
+                file_name=f"Daily Performance Report {today_str}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+            if show_report and job['report']:
+                st.subheader("Run report")
+                st.json(job['report'])
 
 
 
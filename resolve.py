@@ -0,0 +1,284 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+import openpyxl
+from extract import extract_raw_workbook, extract_sheet
+from helper import is_meaningful_data, banner_month_id, get_parent_header_for_column
+from instrumentation import instrumented, sheet_scope
+from schema import current_schema
+
+logger = logging.getLogger(__name__)
+
+# Hardcode the latest AUM to column C and the older AUM to column B.
+LATEST_AUM_COL_RAW = 3  # Column C
+OLDER_AUM_COL_RAW = 2  # Column B
+
+
+@instrumented
+def build_column_plan(raw_col_map, dest_col_map, latest_month_id, older_month_id):
+    """
+    Resolves, once per sheet, the raw source columns (latest / older / static) and the
+    destination column of every mapped template header so the row loop only does lookups.
+    """
+    schema = current_schema()
+    # (header ID, month_id) -> first raw column carrying it, same precedence as a left-to-right scan.
+    # Raw headers the mapping does not read are left out.
+    column_index = {}
+    for c, v in raw_col_map.items():
+        if (header_id := schema.header_ids.get(v['header'])) is not None:
+            column_index.setdefault((header_id, v['month_id']), c)
+
+    standard = []
+    for header_id, tpl_h, month_grouped in schema.standard:
+        if tpl_h in dest_col_map:
+            standard.append({'header': tpl_h,
+                             'dest_col': dest_col_map[tpl_h],
+                             'latest_col': column_index.get((header_id, latest_month_id)),
+                             'older_col': column_index.get((header_id, older_month_id)),
+                             'static_col': column_index.get((header_id, None)),
+                             'month_grouped': month_grouped})
+
+    rating = [{'header': header,
+               'dest_col': dest_col_map.get(header),
+               'latest_col': column_index.get((header_id, latest_month_id)),
+               'older_col': column_index.get((header_id, older_month_id))} for header_id, header in schema.rating]
+
+    return {'standard': standard, 'rating': rating, 'index': column_index}
+
+
+def has_value(val):
+    """Looser check used by the expense ratio block, where a zero is a real value."""
+    return val is not None and str(val).strip() != ""
+
+
+def resolve_fallback(row_count, latest=None, older=None, static=None, is_present=is_meaningful_data):
+    """
+    Resolves a whole column pair with one pass per source column: the latest value when present,
+    else the older one, else the static value. Columns are sequences of row_count values, or None
+    when the sheet does not have that column.
+    Returns (values, is_older) where is_older marks the rows taken from the older column.
+    """
+    values, is_older = [None] * row_count, [False] * row_count
+    pending = range(row_count)
+    if latest is not None:
+        pending = []
+        for i, val in enumerate(latest):
+            if is_present(val):
+                values[i] = val
+            else:
+                pending.append(i)
+    if older is not None:
+        still_pending = []
+        for i in pending:
+            if is_present(val := older[i]):
+                values[i] = val
+                is_older[i] = True
+            else:
+                still_pending.append(i)
+        pending = still_pending
+    if static is not None:
+        for i in pending:
+            values[i] = static[i]
+    return values, is_older
+
+
+def _block(header, dest_col, values, is_older, fill=True):
+    return {'header': header, 'dest_col': dest_col, 'values': values, 'is_older': is_older, 'fill': fill}
+
+
+def _column_or_none(raw_data, col):
+    return raw_data.column(col) if col else None
+
+
+@instrumented
+def resolve_standard_columns(raw_data, column_plan):
+    # A) Standard columns: latest -> older -> static
+    blocks = []
+    for entry in column_plan['standard']:
+        values, is_older = resolve_fallback(raw_data.row_count,
+                                            _column_or_none(raw_data, entry['latest_col']),
+                                            _column_or_none(raw_data, entry['older_col']),
+                                            _column_or_none(raw_data, entry['static_col']))
+        blocks.append(_block(entry['header'], entry['dest_col'], values, is_older, fill=entry['month_grouped']))
+    return blocks
+
+
+@instrumented
+def resolve_rating_allocation(raw_data, column_plan):
+    # A2) Rating allocation block (special rule): if the latest month has *any* rating filled for a
+    # scheme, the whole block comes from the latest month, otherwise from the older month
+    rows = range(raw_data.row_count)
+    latest_cols = {entry['header']: raw_data.column(entry['latest_col'])
+                   for entry in column_plan['rating'] if entry['latest_col']}
+    latest_has_any = [False] * raw_data.row_count
+    for col_values in latest_cols.values():
+        for i in rows:
+            if not latest_has_any[i] and is_meaningful_data(col_values[i]):
+                latest_has_any[i] = True
+
+    blocks = []
+    for entry in column_plan['rating']:
+        if not entry['dest_col']:
+            continue
+        latest = latest_cols.get(entry['header'])
+        older = _column_or_none(raw_data, entry['older_col'])
+        values, is_older = [], []
+        for i in rows:
+            if latest_has_any[i]:
+                values.append(latest[i] if latest is not None else None)
+                is_older.append(False)
+            elif older is not None and is_meaningful_data(older[i]):
+                values.append(older[i])
+                is_older.append(True)
+            else:
+                values.append(None)
+                is_older.append(False)
+        blocks.append(_block(entry['header'], entry['dest_col'], values, is_older))
+    return blocks
+
+
+@instrumented
+def resolve_aum(raw_data, aum_dest_col, latest_aum_col_raw, older_aum_col_raw):
+    # B) AUM
+    if not aum_dest_col:
+        return []
+    latest = _column_or_none(raw_data, latest_aum_col_raw)
+    older = _column_or_none(raw_data, older_aum_col_raw)
+    if latest is not None and older is not None and logger.isEnabledFor(logging.DEBUG):
+        for i, val in enumerate(latest):
+            if not is_meaningful_data(val):
+                logger.debug(f"        > LATEST was empty. Checking OLDER AUM (col {older_aum_col_raw})... "
+                             f"Found: '{older[i]}'")
+    values, is_older = resolve_fallback(raw_data.row_count, latest, older)
+    return [_block("AUM", aum_dest_col, values, is_older)]
+
+
+@instrumented
+def resolve_expense_ratio(raw_data, exp_dates, dest_col_map):
+    # C) Historical Expense Ratio: newest dated column, else the one before it
+    if not (exp_dates and (dest_col := dest_col_map.get("Direct Expense Ratio"))):
+        return []
+    latest = raw_data.column(exp_dates[0][0])
+    older = raw_data.column(exp_dates[1][0]) if len(exp_dates) > 1 else None
+    values, is_older = resolve_fallback(raw_data.row_count, latest, older, is_present=has_value)
+    return [_block("Direct Expense Ratio", dest_col, values, is_older)]
+
+
+def resolve_sheet(raw_data, column_plan, dest_col_map, aum_dest_col, latest_aum_col_raw, older_aum_col_raw, exp_dates):
+    """
+    Resolves every written column of a sheet. Blocks are returned in write order: a later block
+    targeting the same destination column overrides an earlier one, as the row-by-row writers did.
+    """
+    return (resolve_standard_columns(raw_data, column_plan)
+            + resolve_rating_allocation(raw_data, column_plan)
+            + resolve_aum(raw_data, aum_dest_col, latest_aum_col_raw, older_aum_col_raw)
+            + resolve_expense_ratio(raw_data, exp_dates, dest_col_map))
+
+
+def older_data_used(blocks):
+    """True when any filled block took at least one value from the older column."""
+    return any(block['fill'] and any(block['is_older']) for block in blocks)
+
+
+@instrumented
+def analyse_raw_header(raw_data):
+    """
+    Reads the raw header band: the header and month ID of every column, the latest and older month IDs,
+    and the dated columns grouped by their parent header (newest first).
+    """
+    raw_header_index = raw_data.header_index
+    data_header_row_raw = raw_data.header_row
+    raw_header_values = raw_data.header_values
+    raw_col_map = {c: {'header': str(value).strip() if value else "",
+                       'month_id': banner_month_id(raw_header_index, raw_data.month_banners, data_header_row_raw, c)}
+                   for c, value in enumerate(raw_header_values, 1)}
+    all_month_ids = sorted(list(set(v['month_id'] for v in raw_col_map.values() if v['month_id'] is not None)),
+                           reverse=True)
+    latest_month_id = all_month_ids[0] if all_month_ids else None
+    older_month_id = all_month_ids[1] if len(all_month_ids) > 1 else None
+
+    raw_date_columns_by_parent = {}
+    for col, date_v in raw_data.date_headers.items():
+        parent = get_parent_header_for_column(raw_header_index, data_header_row_raw, col) or "(unknown parent)"
+        raw_date_columns_by_parent.setdefault(parent, []).append((col, date_v))
+    for p, lst in raw_date_columns_by_parent.items():
+        raw_date_columns_by_parent[p] = sorted(lst, key=lambda t: t[1], reverse=True)
+
+    return raw_col_map, latest_month_id, older_month_id, raw_date_columns_by_parent
+
+
+def resolve_raw_sheet(raw_data, layout):
+    """
+    Everything process_sheet needs to fill one template sheet, computed from the raw sheet alone and the
+    template layout (see template_layout in template_cache.py). Plain data only, so it can come back from a worker.
+    """
+    result = {'header_row': raw_data.header_row, 'row_count': 0, 'blocks': [], 'any_older_data_used': False,
+              'latest_month_id': None, 'older_month_id': None, 'older_date_for_legend': None, 'as_on_date': None}
+    if raw_data.header_row == -1 or layout is None:
+        return result
+
+    with sheet_scope(raw_data.title):
+        return _resolve_raw_sheet(raw_data, layout, result)
+
+
+def _resolve_raw_sheet(raw_data, layout, result):
+    raw_col_map, latest_month_id, older_month_id, raw_date_columns_by_parent = analyse_raw_header(raw_data)
+    dest_col_map = layout['dest_col_map']
+    exp_dates = next((v for k, v in raw_date_columns_by_parent.items() if 'expense' in k.lower()), [])
+    column_plan = build_column_plan(raw_col_map, dest_col_map, latest_month_id, older_month_id)
+    blocks = resolve_sheet(raw_data, column_plan, dest_col_map, layout['aum_dest_col'], LATEST_AUM_COL_RAW,
+                           OLDER_AUM_COL_RAW, exp_dates)
+    # Get the date for the legend directly from the known cell B<header row>, if it holds one.
+    older_date_for_legend = raw_data.header_index.value(raw_data.header_row, 2)
+    result.update(row_count=raw_data.row_count, blocks=blocks, any_older_data_used=older_data_used(blocks),
+                  latest_month_id=latest_month_id, older_month_id=older_month_id,
+                  as_on_date=raw_data.as_on_date,
+                  older_date_for_legend=older_date_for_legend if isinstance(older_date_for_legend, datetime) else None)
+    return result
+
+
+# --- PARALLEL RESOLUTION ---
+_worker_workbook = None
+
+
+def _init_worker(raw_source):
+    global _worker_workbook
+    if isinstance(raw_source, bytes):
+        raw_source = BytesIO(raw_source)
+    _worker_workbook = openpyxl.load_workbook(raw_source, read_only=True, data_only=True)
+
+
+def _resolve_in_worker(sheet_name, layout):
+    return resolve_raw_sheet(extract_sheet(_worker_workbook[sheet_name]), layout)
+
+
+@instrumented
+def resolve_raw_sheets(raw_file, layouts, sheets_to_ignore=(), workers=1):
+    """
+    Extracts and resolves every raw sheet that is not ignored, returning {sheet_name: result} in
+    workbook order. With workers > 1 the sheets are spread over a process pool; each worker opens the
+    raw workbook once and the results are identical to the serial path.
+    """
+    if workers <= 1:
+        raw_sheets = extract_raw_workbook(raw_file, sheets_to_ignore)
+        return {name: resolve_raw_sheet(raw_data, layouts.get(name)) for name, raw_data in raw_sheets.items()}
+
+    if isinstance(raw_file, (str, os.PathLike)):
+        raw_source = raw_file
+    else:
+        # Uploaded / in-memory files cannot be shared between processes, their bytes can
+        raw_file.seek(0)
+        raw_source = raw_file.read()
+    raw_wb = openpyxl.load_workbook(BytesIO(raw_source) if isinstance(raw_source, bytes) else raw_source,
+                                    read_only=True)
+    sheet_names = [name for name in raw_wb.sheetnames if name not in sheets_to_ignore]
+    raw_wb.close()
+
+    # Stages run inside the worker processes are not recorded in the run report, only the pool's total
+    with ProcessPoolExecutor(max_workers=min(workers, len(sheet_names) or 1), initializer=_init_worker,
+                             initargs=(raw_source,)) as pool:
+        futures = {name: pool.submit(_resolve_in_worker, name, layouts.get(name)) for name in sheet_names}
+        return {name: future.result() for name, future in futures.items()}
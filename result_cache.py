@@ -0,0 +1,97 @@
+"""
+Cache of generated reports keyed by the content of the inputs, so a repeat upload of the same raw file
+(same template, mapping and day) is served without re-running the pipeline.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from helper import file_sha256
+from schema import mapping_fingerprint
+
+
+def result_key(raw_bytes, template_path, run_date=None):
+    """
+    Key of a generated report: the uploaded bytes, the template file, the mapping configuration and the
+    run date (the output carries today's date and the "As on" date).
+    """
+    digest = hashlib.sha256()
+    for part in (hashlib.sha256(raw_bytes).hexdigest(), file_sha256(template_path), mapping_fingerprint(),
+                 (run_date or date.today()).isoformat()):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier LRU of generated workbook bytes: an in-memory tier bounded by memory_max_bytes and an
+    on-disk tier in `directory` bounded by disk_max_bytes, where the least recently used files are
+    evicted first. Safe to share between Streamlit sessions (threads).
+    """
+
+    def __init__(self, directory, disk_max_bytes=500 * 1024 * 1024, memory_max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.xlsx")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)  # mark as recently used for the disk LRU
+            except FileNotFoundError:
+                return None
+            self._remember(key, data)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, data)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".xlsx"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
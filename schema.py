@@ -0,0 +1,112 @@
+"""
+The raw-to-template column mapping, compiled once per process.
+
+The mapping is three lists: the raw header -> template header map, the template headers grouped by month
+(the latest month's value with a fallback to the older month, highlighted when it falls back), and the
+rating allocation headers, which are resolved together as one block. By default it comes from config.py;
+a JSON or YAML file with the same three keys replaces it, e.g. for a new vendor layout:
+
+    {"header_map": {"Scheme Name": "Scheme Name", ...}, "month_grouped": [...], "rating": [...]}
+
+Point the MAPPING_FILE environment variable (or `cli.py --mapping`) at the file. Compiling turns the
+lists into frozensets and integer header IDs and checks that every month-grouped and rating header is a
+mapped column, so a mistake in the file fails the run up front instead of silently leaving columns empty.
+
+    python schema.py vendor_mapping.yaml        # validate a mapping file
+    python schema.py --dump mapping.json        # write the built-in mapping as a starting point
+"""
+import argparse
+import json
+import os
+from functools import lru_cache
+
+from config import RAW_TO_TEMPLATE_HEADER_MAP, MONTH_GROUPED_HEADERS, RATING_HEADERS, SHEETS_TO_IGNORE
+
+MAPPING_FILE_ENV = "MAPPING_FILE"
+
+
+class MappingSchema:
+    """
+    A validated mapping. `header_ids` numbers every raw header that is read; `standard` holds
+    (raw header ID, template header, month grouped) for the columns copied one by one and `rating`
+    holds (header ID, header) for the rating allocation block, in write order.
+    """
+
+    def __init__(self, header_map, month_grouped, rating, source="config.py"):
+        self.source = source
+        self.header_map = dict(header_map)
+        self.month_grouped = frozenset(month_grouped)
+        self.rating_headers = tuple(dict.fromkeys(rating))
+        self.rating_set = frozenset(self.rating_headers)
+        self.validate()
+
+        self.header_ids = {raw_h: i for i, raw_h in enumerate(self.header_map)}
+        self.standard = tuple((self.header_ids[raw_h], tpl_h, tpl_h in self.month_grouped)
+                              for raw_h, tpl_h in self.header_map.items() if tpl_h not in self.rating_set)
+        self.rating = tuple((self.header_ids[header], header) for header in self.rating_headers)
+
+    def validate(self):
+        """Raises ValueError listing every header of the mapping that cannot be resolved."""
+        problems = [f"header {h!r} is not a non-empty string" for h in (*self.header_map, *self.header_map.values())
+                    if not isinstance(h, str) or not h.strip()]
+        template_headers = set(self.header_map.values())
+        problems += [f"month-grouped header {h!r} is not a template header of header_map"
+                     for h in sorted(self.month_grouped - template_headers)]
+        problems += [f"rating header {h!r} must be mapped to itself in header_map (found {self.header_map.get(h)!r})"
+                     for h in self.rating_headers if self.header_map.get(h) != h]
+        if problems:
+            raise ValueError(f"Invalid column mapping in {self.source}:\n  " + "\n  ".join(problems))
+
+    def to_dict(self):
+        return {'header_map': self.header_map, 'month_grouped': sorted(self.month_grouped),
+                'rating': list(self.rating_headers)}
+
+    def fingerprint(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+
+def load_mapping(path):
+    """Compiles the mapping in a .json, .yaml or .yml file."""
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError(f"Reading {path} needs PyYAML (pip install pyyaml); or use a JSON mapping.") \
+                    from None
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get('header_map'), dict):
+        raise ValueError(f"Invalid column mapping in {path}: expected an object with a 'header_map' object")
+    return MappingSchema(data['header_map'], data.get('month_grouped', []), data.get('rating', []), source=path)
+
+
+@lru_cache(maxsize=None)
+def _compiled(path):
+    if path:
+        return load_mapping(path)
+    return MappingSchema(RAW_TO_TEMPLATE_HEADER_MAP, MONTH_GROUPED_HEADERS, RATING_HEADERS)
+
+
+def current_schema():
+    """The mapping in use: the file named by $MAPPING_FILE, else the one in config.py."""
+    return _compiled(os.environ.get(MAPPING_FILE_ENV) or None)
+
+
+def mapping_fingerprint():
+    """The mapping in use plus the ignored sheets, as keyed by the result cache and the incremental state."""
+    return json.dumps([current_schema().fingerprint(), SHEETS_TO_IGNORE])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate a column mapping file, or dump the built-in mapping.")
+    parser.add_argument("path", nargs="?", help="JSON or YAML mapping to validate (default: the one in config.py)")
+    parser.add_argument("--dump", metavar="PATH", help="write the mapping as JSON to PATH")
+    args = parser.parse_args()
+    schema = load_mapping(args.path) if args.path else _compiled(None)
+    print(f"{schema.source}: {len(schema.header_map)} mapped headers, {len(schema.month_grouped)} month grouped, "
+          f"{len(schema.rating_headers)} rating headers. OK")
+    if args.dump:
+        with open(args.dump, "w", encoding="utf-8") as f:
+            json.dump(schema.to_dict(), f, indent=2)
@@ -0,0 +1,69 @@
+"""
+Cell styles registered once per workbook and applied to cells by id.
+
+Assigning `cell.fill = ...` (or font, border, alignment, number format) makes openpyxl hash the style
+object and look it up in the workbook's style list on every cell. A CellStyles registers each named bundle of style
+objects once and then applies it by setting the ids in the cells' style arrays directly, leaving cells
+that already carry them untouched. The result is the same as assigning the objects one by one.
+"""
+import weakref
+
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_REVERSE, BUILTIN_FORMATS_MAX_SIZE
+
+# Position of each style kind in a cell's StyleArray, and the workbook list that ids index into
+_SLOTS = {'font': (0, '_fonts'), 'fill': (1, '_fills'), 'border': (2, '_borders'),
+          'number_format': (3, '_number_formats'), 'alignment': (5, '_alignments')}
+
+_registries = weakref.WeakKeyDictionary()
+
+
+class CellStyles:
+    """The named style bundles registered in one workbook."""
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self.ids = {}
+
+    @classmethod
+    def of(cls, workbook, bundles):
+        """The workbook's CellStyles, with every bundle of {name: {kind: style object}} registered."""
+        registry = _registries.get(workbook)
+        if registry is None:
+            registry = _registries[workbook] = cls(workbook)
+        for name, styles in bundles.items():
+            if name not in registry.ids:
+                registry.register(name, styles)
+        return registry
+
+    def register(self, name, styles):
+        """
+        Registers a bundle of style objects keyed by kind ('font', 'fill', 'border', 'alignment', or
+        'number_format' with a format string).
+        """
+        self.ids[name] = tuple((_SLOTS[kind][0], self._style_id(kind, style)) for kind, style in styles.items())
+
+    def _style_id(self, kind, style):
+        if kind == 'number_format' and style in BUILTIN_FORMATS_REVERSE:
+            return BUILTIN_FORMATS_REVERSE[style]
+        style_id = getattr(self.workbook, _SLOTS[kind][1]).add(style)
+        # Custom number formats are numbered after the built-in ones, as openpyxl does
+        return style_id + BUILTIN_FORMATS_MAX_SIZE if kind == 'number_format' else style_id
+
+    def apply(self, cells, name):
+        """Applies a bundle to cells and returns how many of them changed."""
+        ids = self.ids[name]
+        changed = 0
+        for cell in cells:
+            style = cell._style
+            if not style:
+                style = cell._style = StyleArray()
+            if any(style[slot] != style_id for slot, style_id in ids):
+                for slot, style_id in ids:
+                    style[slot] = style_id
+                changed += 1
+        return changed
+
+    def apply_range(self, sheet, cell_range, name):
+        """Applies a bundle to every cell of a range like 'H1:L2'."""
+        return self.apply((cell for row in sheet[cell_range] for cell in row), name)
@@ -0,0 +1,115 @@
+"""
+The template workbook parsed once and reused across runs.
+
+Loading the template with openpyxl is the fixed cost of every run. A PreparedTemplate keeps a pickled
+snapshot of the loaded workbook together with the per-sheet layouts (header row, column map, AUM column,
+benchmark row and "As on" cell), so each run unpickles a private copy instead of re-parsing the file.
+The snapshot is rebuilt only when the template file's content changes.
+"""
+import copyreg
+import logging
+import os
+import pickle
+import threading
+
+import openpyxl
+from openpyxl.worksheet.dimensions import DimensionHolder
+
+from config import SHEETS_TO_IGNORE
+from openpyxl.utils import get_column_letter
+
+from helper import HeaderScan, find_benchmark_row, file_sha256
+from instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
+
+def _rebuild_dimension_holder(worksheet, reference, default_factory, max_outline, items):
+    holder = DimensionHolder(worksheet, reference, default_factory)
+    holder.max_outline = max_outline
+    dict.update(holder, items)
+    return holder
+
+
+# DimensionHolder is a BoundDictionary whose default pickling loses its constructor arguments,
+# which breaks column_dimensions after a round trip.
+copyreg.pickle(DimensionHolder, lambda h: (_rebuild_dimension_holder,
+                                           (h.worksheet, h.reference, h.default_factory, h.max_outline, dict(h))))
+
+
+@instrumented
+def template_layout(template_sheet):
+    """
+    Header row, destination column of every header, AUM column, benchmark row and "As on" cell of a
+    template sheet, or None when the sheet has no "Scheme Name" header. Everything above the data comes
+    from one HeaderScan of the sheet's top rows.
+    """
+    scan = HeaderScan(enumerate(template_sheet.iter_rows(max_col=template_sheet.max_column, values_only=True), 1))
+    data_header_row_template = scan.header_row
+    if data_header_row_template == -1:
+        return None
+    dest_col_map = {str(value).strip(): c for c, value in enumerate(scan.band[-1], 1) if value}
+    aum_dest_col = next((c for row in scan.band[max(data_header_row_template - 3, 0):]
+                         for c, value in enumerate(row, 1) if "AUM" in str(value)), None)
+    as_on_cell = scan.as_on_cell and f"{get_column_letter(scan.as_on_cell[1])}{scan.as_on_cell[0]}"
+    return {'header_row': data_header_row_template, 'dest_col_map': dest_col_map, 'aum_dest_col': aum_dest_col,
+            'benchmark_row': find_benchmark_row(template_sheet), 'as_on_cell': as_on_cell}
+
+
+class PreparedTemplate:
+    """A parsed template: its layouts plus a pickled workbook that every run gets a fresh copy of."""
+
+    def __init__(self, path, sheets_to_ignore=SHEETS_TO_IGNORE):
+        self.path = path
+        self.sheets_to_ignore = tuple(sheets_to_ignore)
+        self.stamp = _stat_stamp(path)
+        self.sha256 = file_sha256(path)
+        workbook = openpyxl.load_workbook(path)
+        self.layouts = {ws.title: template_layout(ws) for ws in workbook.worksheets
+                        if ws.title not in sheets_to_ignore}
+        self._snapshot = pickle.dumps(workbook, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def workbook(self):
+        """A private, writable copy of the template workbook."""
+        return pickle.loads(self._snapshot)
+
+
+def _stat_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+_prepared = {}
+_prepared_lock = threading.Lock()
+
+
+def _cache_key(path, sheets_to_ignore):
+    return os.path.abspath(path), tuple(sheets_to_ignore)
+
+
+def get_prepared_template(path, sheets_to_ignore=SHEETS_TO_IGNORE):
+    """
+    The PreparedTemplate for path, shared across calls in this process. A changed size or mtime triggers
+    a re-hash, and the template is only re-parsed when the content hash actually differs.
+    """
+    key = _cache_key(path, sheets_to_ignore)
+    with _prepared_lock:
+        prepared = _prepared.get(key)
+        if prepared is not None and prepared.stamp != _stat_stamp(path):
+            if file_sha256(path) == prepared.sha256:
+                prepared.stamp = _stat_stamp(path)
+            else:
+                prepared = None
+        if prepared is None:
+            logger.info(f"Parsing template '{path}'")
+            prepared = _prepared[key] = PreparedTemplate(path, sheets_to_ignore)
+        return prepared
+
+
+def share_prepared_template(prepared):
+    """
+    Installs a PreparedTemplate built in another process, so a pool worker reuses the parent's parse
+    instead of parsing the template again.
+    """
+    with _prepared_lock:
+        _prepared[_cache_key(prepared.path, prepared.sheets_to_ignore)] = prepared
@@ -0,0 +1,350 @@
+"""
+Checks that the column-plan pipeline (resolve_raw_sheets + process_sheet) fills the template exactly like
+the original row-by-row handlers did, for both checked-in raw files: same values, fills and column widths.
+
+The reference below is the pre-plan logic of main.py and helper.py, kept as it was apart from the two
+documented fixes: the older-data legend is written (any_older_data_used used to be dropped by every
+handler) and the widths count the last data row (the per-row auto-fit used to run before each row).
+
+    python -m pytest -q test_column_plan.py
+"""
+from datetime import datetime, timedelta
+
+import openpyxl
+import pytest
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+
+from config import RAW_TO_TEMPLATE_HEADER_MAP, MONTH_GROUPED_HEADERS, RATING_HEADERS, SHEETS_TO_IGNORE, \
+    template_file
+from main import process_sheet
+from resolve import resolve_raw_sheets
+from template_cache import get_prepared_template
+
+RAW_FILES = ["Daily Performance - Testing.xlsx", "Daily Performance Sheet - 05 Aug 2025.xlsx"]
+
+light_brown_fill = PatternFill(start_color="DCC7A3", end_color="DCC7A3", fill_type="solid")
+no_fill = PatternFill(fill_type=None)
+back_button_fill = PatternFill(start_color="DCC783", end_color="DCC783", fill_type="solid")
+center_align = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+
+# --- Reference: the pre-plan helpers ---
+def is_meaningful_data(val):
+    if val is None:
+        return False
+    if isinstance(val, str) and val.strip() in ["", "-"]:
+        return False
+    if isinstance(val, (int, float)) and val == 0:
+        return False
+    return True
+
+
+def is_date_like(v):
+    if v is None: return None
+    if isinstance(v, datetime): return v
+    if isinstance(v, str):
+        for fmt in ("%d-%b-%Y", "%d-%b-%y", "%d-%b-%Y ", "%d-%m-%Y", "%Y-%m-%d"):
+            try:
+                return datetime.strptime(v.strip(), fmt)
+            except Exception:
+                continue
+    return None
+
+
+def find_header_row(sheet, keyword="Scheme Name"):
+    for r in range(1, 25):
+        for cell in sheet[r]:
+            if cell.value and str(cell.value).strip() == keyword: return r
+    return -1
+
+
+def update_as_on_date(sheet):
+    for r in range(1, 11):
+        for cell in sheet[r]:
+            if cell.value and str(cell.value).strip().startswith("As on"):
+                yesterday = datetime.today() - timedelta(days=1)
+                cell.value = f"As on {yesterday.strftime('%Y-%b-%d')}"
+                return True
+    return False
+
+
+def get_month_id_for_column(sheet, row, col):
+    for r in range(row - 1, 0, -1):
+        for merged_range in sheet.merged_cells.ranges:
+            if merged_range.min_row <= r <= merged_range.max_row and merged_range.min_col <= col <= merged_range.max_col:
+                top_left_cell = sheet.cell(row=merged_range.min_row, column=merged_range.min_col)
+                if isinstance(top_left_cell.value, int) and len(str(top_left_cell.value)) == 6:
+                    return top_left_cell.value
+    return None
+
+
+def get_parent_header_for_column(sheet, header_row, col):
+    for r in range(header_row - 1, 0, -1):
+        val = sheet.cell(row=r, column=col).value
+        if val is None:
+            for merged_range in sheet.merged_cells.ranges:
+                if merged_range.min_row <= r <= merged_range.max_row and merged_range.min_col <= col <= merged_range.max_col:
+                    top_left = sheet.cell(row=merged_range.min_row, column=merged_range.min_col)
+                    if top_left.value: return str(top_left.value).strip()
+            continue
+        if isinstance(val, int) and len(str(val)) == 6: continue
+        if is_date_like(val): continue
+        return str(val).strip()
+    return None
+
+
+def auto_fit_columns(sheet):
+    column_widths = {}
+    for row in sheet.iter_rows():
+        for cell in row:
+            if cell.value:
+                cell_len = len(str(cell.value)) + 2
+                if cell.column_letter not in column_widths or cell_len > column_widths[cell.column_letter]:
+                    column_widths[cell.column_letter] = cell_len
+    for col_letter, width in column_widths.items():
+        sheet.column_dimensions[col_letter].width = min(width, 22)
+
+
+# --- Reference: the pre-plan sheet filling ---
+def format_and_legend(template_sheet, data_header_row_template, start_row_template, rows_on_this_sheet, aum_dest_col,
+                      any_older_data_used, older_date_for_legend, older_month_id):
+    if aum_dest_col:
+        template_sheet.merge_cells(start_row=data_header_row_template - 2, end_row=data_header_row_template - 1,
+                                   start_column=aum_dest_col, end_column=aum_dest_col)
+        corpus_cell = template_sheet.cell(row=data_header_row_template - 2, column=aum_dest_col)
+        corpus_cell.value = "Corpus"
+        corpus_cell.alignment = center_align
+        template_sheet.cell(row=data_header_row_template, column=aum_dest_col).value = "AUM (Cr.)"
+
+    if any_older_data_used:
+        older_date_str = older_date_for_legend.strftime('%d-%b-%Y') if older_date_for_legend else (
+                older_month_id and datetime.strptime(str(older_month_id), "%Y%m").strftime("%b-%Y"))
+        if older_date_str:
+            legend_row = start_row_template + rows_on_this_sheet + 2
+            template_sheet.cell(row=legend_row, column=1).fill = light_brown_fill
+            template_sheet.cell(row=legend_row, column=2).value = f"Indicates data as of {older_date_str}"
+            template_sheet.cell(row=legend_row, column=2).font = Font(bold=True)
+
+    template_sheet['A2'].value = "Home"
+    template_sheet['A2'].fill = back_button_fill
+    template_sheet.column_dimensions['A'].width = 50
+
+
+def remove_benchmark(template_sheet, data_header_row_template):
+    if (benchmark_row := next((r for r in range(1, template_sheet.max_row + 2) if
+                               str(template_sheet.cell(row=r, column=1).value).strip().lower() == "benchmark"), None)):
+        template_sheet.delete_rows(benchmark_row, template_sheet.max_row - benchmark_row + 2)
+    clear_from = data_header_row_template + 1
+    if template_sheet.max_row >= clear_from:
+        for row in template_sheet.iter_rows(min_row=clear_from):
+            if not row[0].value or str(row[0].value).strip() == "": break
+            for cell in row: cell.value = None
+
+
+def handling_standard_column(dest_col_map, raw_col_map, raw_sheet, row_num, latest_month_id, older_month_id,
+                             template_sheet, template_row_index):
+    any_older_data_used = False
+    for raw_h, tpl_h in RAW_TO_TEMPLATE_HEADER_MAP.items():
+        if tpl_h in dest_col_map and tpl_h not in ["AAA", "AA / AA+ / AA-", "A / A+ / A1+ / A1-", "D", "Unrated",
+                                                   "Cash & Equivalent", "Others", "SOV"]:
+            dest_col = dest_col_map[tpl_h]
+            final_value, is_older = None, False
+            latest_col = next(
+                (c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] == latest_month_id), None)
+            older_col = next(
+                (c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] == older_month_id), None)
+            static_col = next((c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] is None),
+                              None)
+
+            if latest_col:
+                latest_val = raw_sheet.cell(row=row_num, column=latest_col).value
+                if is_meaningful_data(latest_val):
+                    final_value = latest_val
+
+            if final_value is None and older_col:
+                older_val = raw_sheet.cell(row=row_num, column=older_col).value
+                if is_meaningful_data(older_val):
+                    final_value = older_val
+                    is_older = True
+                    any_older_data_used = True
+
+            if final_value is None and static_col:
+                final_value = raw_sheet.cell(row=row_num, column=static_col).value
+
+            dest_cell = template_sheet.cell(row=template_row_index, column=dest_col)
+            dest_cell.value = final_value
+            if tpl_h in MONTH_GROUPED_HEADERS:
+                dest_cell.fill = light_brown_fill if is_older else no_fill
+    return any_older_data_used
+
+
+def handling_rating_allocation(raw_col_map, latest_month_id, raw_sheet, row_num, dest_col_map, older_month_id,
+                               template_sheet, template_row_index):
+    any_older_data_used = False
+    latest_has_any = False
+    latest_vals = {}
+    for raw_h in RATING_HEADERS:
+        latest_col = next(
+            (c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] == latest_month_id), None)
+        if latest_col:
+            val = raw_sheet.cell(row=row_num, column=latest_col).value
+            if is_meaningful_data(val):
+                latest_has_any = True
+            latest_vals[raw_h] = val
+
+    for raw_h in RATING_HEADERS:
+        if raw_h not in dest_col_map:
+            continue
+        if latest_has_any:
+            final_val, is_older = latest_vals.get(raw_h), False
+        else:
+            older_col = next(
+                (c for c, v in raw_col_map.items() if v['header'] == raw_h and v['month_id'] == older_month_id), None)
+            final_val, is_older = None, False
+            if older_col:
+                val = raw_sheet.cell(row=row_num, column=older_col).value
+                if is_meaningful_data(val):
+                    final_val = val
+                    is_older = True
+                    any_older_data_used = True
+
+        dest_cell = template_sheet.cell(row=template_row_index, column=dest_col_map[raw_h])
+        dest_cell.value = final_val
+        dest_cell.fill = light_brown_fill if is_older else no_fill
+    return any_older_data_used
+
+
+def handling_AUM(aum_dest_col, latest_aum_col_raw, older_aum_col_raw, raw_sheet, row_num, template_sheet,
+                 template_row_index):
+    any_older_data_used = False
+    if aum_dest_col:
+        aum_value, aum_is_older = None, False
+        val = raw_sheet.cell(row=row_num, column=latest_aum_col_raw).value
+        if is_meaningful_data(val):
+            aum_value = val
+        if aum_value is None:
+            val = raw_sheet.cell(row=row_num, column=older_aum_col_raw).value
+            if is_meaningful_data(val):
+                aum_value = val
+                aum_is_older = True
+                any_older_data_used = True
+
+        dest_cell = template_sheet.cell(row=template_row_index, column=aum_dest_col)
+        dest_cell.value = aum_value
+        dest_cell.fill = light_brown_fill if aum_is_older else no_fill
+    return any_older_data_used
+
+
+def handle_expense_ration(exp_dates, dest_col_map, raw_sheet, row_num, template_sheet, template_row_index):
+    any_older_data_used = False
+    if exp_dates and (dest_col := dest_col_map.get("Direct Expense Ratio")):
+        her_value, her_is_older = None, False
+        if (val := raw_sheet.cell(row=row_num, column=exp_dates[0][0]).value) is not None and str(val).strip() != "":
+            her_value = val
+        if her_value is None and len(exp_dates) > 1 and (
+                val := raw_sheet.cell(row=row_num, column=exp_dates[1][0]).value) is not None and str(val).strip() != "":
+            her_value = val
+            her_is_older = True
+            any_older_data_used = True
+
+        dest_cell = template_sheet.cell(row=template_row_index, column=dest_col)
+        dest_cell.value = her_value
+        dest_cell.fill = light_brown_fill if her_is_older else no_fill
+    return any_older_data_used
+
+
+def reference_process_sheet(raw_wb, template_wb):
+    """The pre-plan process_sheet; returns the names of the sheets it filled."""
+    filled = []
+    for sheet_name in raw_wb.sheetnames:
+        if sheet_name in SHEETS_TO_IGNORE or sheet_name not in template_wb.sheetnames:
+            continue
+        raw_sheet = raw_wb[sheet_name]
+        template_sheet = template_wb[sheet_name]
+        filled.append(sheet_name)
+
+        update_as_on_date(template_sheet)
+        data_header_row_raw = find_header_row(raw_sheet)
+        if data_header_row_raw == -1:
+            continue
+        data_header_row_template = find_header_row(template_sheet)
+        if data_header_row_template == -1:
+            continue
+        older_date_for_legend = raw_sheet['B' + str(data_header_row_raw)].value
+
+        raw_col_map = {c: {'header': str(cell.value).strip() if cell.value else "",
+                           'month_id': get_month_id_for_column(raw_sheet, data_header_row_raw, c)} for c, cell in
+                       enumerate(raw_sheet[data_header_row_raw], 1)}
+        all_month_ids = sorted(set(v['month_id'] for v in raw_col_map.values() if v['month_id'] is not None),
+                               reverse=True)
+        latest_month_id = all_month_ids[0] if all_month_ids else None
+        older_month_id = all_month_ids[1] if len(all_month_ids) > 1 else None
+
+        raw_date_columns_by_parent = {}
+        for col, cell in enumerate(raw_sheet[data_header_row_raw], 1):
+            if date_v := is_date_like(cell.value):
+                parent = get_parent_header_for_column(raw_sheet, data_header_row_raw, col) or "(unknown parent)"
+                raw_date_columns_by_parent.setdefault(parent, []).append((col, date_v))
+        for p, lst in raw_date_columns_by_parent.items():
+            raw_date_columns_by_parent[p] = sorted(lst, key=lambda t: t[1], reverse=True)
+
+        dest_col_map = {str(c.value).strip(): c.column for c in template_sheet[data_header_row_template] if c.value}
+        aum_dest_col = next(
+            (c.column for r in range(data_header_row_template - 2, data_header_row_template + 1) for c in
+             template_sheet[r] if "AUM" in str(c.value)), None)
+
+        remove_benchmark(template_sheet, data_header_row_template)
+
+        start_row_template = data_header_row_template + 1
+        rows_on_this_sheet = 0
+        any_older_data_used = False
+        exp_dates = next((v for k, v in raw_date_columns_by_parent.items() if 'expense' in k.lower()), [])
+        for row_num in range(data_header_row_raw + 1, raw_sheet.max_row + 2):
+            if not raw_sheet.cell(row=row_num, column=1).value: break
+            template_row_index = start_row_template + rows_on_this_sheet
+            any_older_data_used |= handling_standard_column(dest_col_map, raw_col_map, raw_sheet, row_num,
+                                                            latest_month_id, older_month_id, template_sheet,
+                                                            template_row_index)
+            any_older_data_used |= handling_rating_allocation(raw_col_map, latest_month_id, raw_sheet, row_num,
+                                                              dest_col_map, older_month_id, template_sheet,
+                                                              template_row_index)
+            any_older_data_used |= handling_AUM(aum_dest_col, 3, 2, raw_sheet, row_num, template_sheet,
+                                                template_row_index)
+            any_older_data_used |= handle_expense_ration(exp_dates, dest_col_map, raw_sheet, row_num,
+                                                         template_sheet, template_row_index)
+            rows_on_this_sheet += 1
+        if rows_on_this_sheet:
+            auto_fit_columns(template_sheet)
+
+        format_and_legend(template_sheet, data_header_row_template, start_row_template, rows_on_this_sheet,
+                          aum_dest_col, any_older_data_used, older_date_for_legend, older_month_id)
+    return filled
+
+
+# --- Comparison ---
+def sheet_contents(sheet):
+    """{coordinate: (value, fill type, fill colour)} of every cell with a value or a fill, and the widths."""
+    cells = {cell.coordinate: (cell.value, cell.fill.fill_type, cell.fill.fgColor.rgb)
+             for row in sheet.iter_rows() for cell in row if cell.value is not None or cell.fill.fill_type}
+    widths = {get_column_letter(col): sheet.column_dimensions[get_column_letter(col)].width
+              for col in range(1, sheet.max_column + 1)}
+    return cells, widths
+
+
+@pytest.mark.parametrize("raw_file", RAW_FILES)
+def test_column_plan_matches_row_by_row_handlers(raw_file):
+    expected_wb = openpyxl.load_workbook(template_file)
+    filled = reference_process_sheet(openpyxl.load_workbook(raw_file, data_only=True), expected_wb)
+    assert filled
+
+    prepared = get_prepared_template(template_file, SHEETS_TO_IGNORE)
+    actual_wb = prepared.workbook()
+    process_sheet(resolve_raw_sheets(raw_file, prepared.layouts, SHEETS_TO_IGNORE), actual_wb, SHEETS_TO_IGNORE,
+                  prepared.layouts)
+
+    for sheet_name in filled:
+        expected_cells, expected_widths = sheet_contents(expected_wb[sheet_name])
+        actual_cells, actual_widths = sheet_contents(actual_wb[sheet_name])
+        assert actual_cells == expected_cells, sheet_name
+        assert actual_widths == expected_widths, sheet_name
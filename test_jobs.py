@@ -0,0 +1,69 @@
+"""
+Checks that the web UI's JobQueue outlives a worker process that dies: the job the worker was running
+fails, and the next upload is still filled, whether the worker died during a job or while idle.
+
+    python -m pytest -q test_jobs.py
+"""
+import io
+import os
+import signal
+import time
+
+import openpyxl
+import pytest
+
+from jobs import JobQueue
+
+RAW_FILE = "Daily Performance - Testing.xlsx"
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(workers=1)
+    yield queue
+    queue.shutdown()
+
+
+@pytest.fixture(scope="module")
+def raw_bytes():
+    with open(RAW_FILE, "rb") as f:
+        return f.read()
+
+
+def wait_for(queue, job_id, statuses, timeout=120):
+    deadline = time.monotonic() + timeout
+    while (status := queue.status(job_id))['status'] not in statuses:
+        assert time.monotonic() < deadline, f"job still {status['status']} after {timeout}s"
+        time.sleep(0.02)
+    return status
+
+
+def kill_workers(pool):
+    for process in list(pool._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+
+
+def assert_filled(queue, job_id):
+    assert wait_for(queue, job_id, ("done", "failed"))['status'] == "done"
+    assert "Home" in openpyxl.load_workbook(io.BytesIO(queue.result(job_id))).sheetnames
+
+
+def test_worker_killed_during_a_job(queue, raw_bytes):
+    first = queue.submit(raw_bytes)
+    assert wait_for(queue, first, ("running", "done", "failed"))['status'] == "running"
+    kill_workers(queue._pool)
+    assert wait_for(queue, first, ("done", "failed"))['status'] == "failed"
+
+    assert_filled(queue, queue.submit(raw_bytes))
+
+
+def test_worker_killed_while_idle(queue, raw_bytes):
+    assert_filled(queue, queue.submit(raw_bytes))
+    pool = queue._pool
+    kill_workers(pool)
+    deadline = time.monotonic() + 30
+    while not pool._broken:  # the pool notices the dead worker on its own; the next submit then fails
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+    assert_filled(queue, queue.submit(raw_bytes))
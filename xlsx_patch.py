@@ -0,0 +1,210 @@
+"""
+Output engine that saves a filled template by patching the template's own .xlsx package.
+
+openpyxl's save re-serialises every part of the workbook. This engine instead copies the template zip
+part by part: only the worksheets the pipeline modified (and their relationships), styles.xml and the core
+document properties are written fresh. Everything else (images, drawings, theme, shared strings, untouched
+sheets) is copied still compressed, byte for byte, so features openpyxl does not round-trip survive.
+
+Modified sheets are serialised with openpyxl's own WorksheetWriter, which writes strings inline, so the
+template's shared string table stays valid as it is. Cell style ids stay valid too: openpyxl keeps the
+template's cellXfs in their original order and only appends new ones.
+"""
+import logging
+import os
+import re
+import struct
+import zipfile
+from datetime import datetime
+
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.packaging.manifest import Manifest, FileExtension, Override
+from openpyxl.packaging.relationship import Relationship, get_dependents, get_rels_path
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.reader.workbook import WorkbookParser
+from openpyxl.styles.stylesheet import write_stylesheet
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.worksheet.related import Related
+from openpyxl.xml.constants import ARC_CONTENT_TYPES, ARC_CORE, ARC_STYLE, ARC_WORKBOOK
+from openpyxl.xml.functions import tostring, fromstring
+
+from instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
+# Relationship types of a worksheet that the patch writer knows how to regenerate
+_SHEET_REL_TYPES = ("drawing", "hyperlink")
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+
+class _PatchWorksheetWriter(WorksheetWriter):
+    """
+    A WorksheetWriter that points the sheet at the drawing part it already has in the template, so the
+    drawing and its images are kept as they are rather than rebuilt from openpyxl's image objects.
+    """
+
+    def __init__(self, ws, drawing_target):
+        self.drawing_target = drawing_target
+        super().__init__(ws)
+
+    def write_drawings(self):
+        if self.drawing_target is None:
+            super().write_drawings()
+            return
+        rel = Relationship(type="drawing", Target=self.drawing_target)
+        self._rels.append(rel)
+        drawing = Related()
+        drawing.id = rel.id
+        self.xf.send(drawing.to_tree("drawing"))
+
+
+class _PartialReader(ExcelReader):
+    """An ExcelReader that parses only some sheets and leaves empty placeholders for the others."""
+
+    def __init__(self, filename, sheet_names):
+        super().__init__(filename)
+        self.sheet_names = set(sheet_names)
+
+    def read_worksheets(self):
+        find_sheets = self.parser.find_sheets
+
+        def wanted_sheets():
+            for sheet, rel in find_sheets():
+                if sheet.name in self.sheet_names:
+                    yield sheet, rel
+                else:
+                    self.wb.create_sheet(sheet.name)
+
+        self.parser.find_sheets = wanted_sheets
+        super().read_worksheets()
+
+
+def load_sheets(filename, sheet_names):
+    """
+    Loads a workbook parsing only sheet_names; every other sheet is an empty placeholder. Only meant to be
+    saved with save_patched onto the same file, which copies the placeholders' real parts unchanged.
+    """
+    reader = _PartialReader(filename, sheet_names)
+    reader.read()
+    return reader.wb
+
+
+def _copy_compressed(source, info, target):
+    """
+    Copies one member of the source zip into the target zip without inflating it. zipfile has no public
+    API for this, so the local header is written directly and the target's directory updated to match.
+    """
+    source.fp.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(source.fp.read(_LOCAL_HEADER.size))
+    source.fp.seek(info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1])
+
+    copied = zipfile.ZipInfo(info.filename, info.date_time)
+    copied.compress_type = info.compress_type
+    copied.flag_bits = info.flag_bits & ~0x08  # sizes go in the local header, no data descriptor
+    copied.external_attr = info.external_attr
+    copied.create_system = info.create_system
+    copied.CRC, copied.compress_size, copied.file_size = info.CRC, info.compress_size, info.file_size
+    copied.header_offset = target.fp.tell()
+    target.fp.write(copied.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.fp.read(min(remaining, 1 << 20))
+        target.fp.write(chunk)
+        remaining -= len(chunk)
+    target.filelist.append(copied)
+    target.NameToInfo[copied.filename] = copied
+    target.start_dir = target.fp.tell()
+    target._didModify = True
+
+
+def _sheet_parts(archive):
+    """Template worksheet part and its existing relationships, keyed by sheet title."""
+    parser = WorkbookParser(archive, ARC_WORKBOOK)
+    parser.parse()
+    parts = {}
+    for sheet, rel in parser.find_sheets():
+        rels_path = get_rels_path(rel.target)
+        rels = get_dependents(archive, rels_path).Relationship if rels_path in archive.namelist() else []
+        parts[sheet.name] = {'path': rel.target, 'rels_path': rels_path, 'rels': rels}
+    return parts
+
+
+def _unsupported_reason(workbook, archive, parts, modified_sheets):
+    """Why this workbook cannot be patched into its template, or None when it can."""
+    if workbook.sheetnames != list(parts):
+        return "the sheets differ from the template's"
+    if "xl/calcChain.xml" in archive.namelist():
+        return "the template has a calculation chain"
+    for title in modified_sheets:
+        ws = workbook[title]
+        if ws._charts or ws._comments or ws._tables or ws._pivots or ws.legacy_drawing is not None:
+            return f"sheet '{title}' has charts, comments, tables or pivots"
+        if any(rel.Type.rsplit("/", 1)[-1] not in _SHEET_REL_TYPES for rel in parts[title]['rels']):
+            return f"sheet '{title}' has relationships other than drawings and hyperlinks"
+    return None
+
+
+def _next_index(names, pattern):
+    return max((int(m.group(1)) for name in names if (m := re.fullmatch(pattern, name))), default=0) + 1
+
+
+@instrumented
+def save_patched(workbook, template_path, output, modified_sheets):
+    """
+    Saves workbook, which was loaded from template_path, by patching the template package: the
+    modified_sheets are rewritten and every other part is copied unchanged. Falls back to a regular
+    openpyxl save (with a warning) when the workbook uses something the patch writer cannot keep in sync.
+    """
+    modified_sheets = [title for title in workbook.sheetnames if title in set(modified_sheets)]
+    with zipfile.ZipFile(template_path) as source:
+        parts = _sheet_parts(source)
+        if reason := _unsupported_reason(workbook, source, parts, modified_sheets):
+            logger.warning(f"Patch writer not usable ({reason}); falling back to a full save.")
+            workbook.save(output)
+            return
+
+        manifest = Manifest.from_tree(fromstring(source.read(ARC_CONTENT_TYPES)))
+        names = source.namelist()
+        next_drawing = _next_index(names, r"xl/drawings/drawing(\d+)\.xml")
+        next_image = _next_index(names, r"xl/media/image(\d+)\.\w+")
+        rewritten = {ARC_STYLE, ARC_CORE, ARC_CONTENT_TYPES}
+        for title in modified_sheets:
+            rewritten.update((parts[title]['path'], parts[title]['rels_path']))
+
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as target:
+            for info in source.infolist():
+                if info.filename not in rewritten:
+                    _copy_compressed(source, info, target)
+
+            for title in modified_sheets:
+                ws, part = workbook[title], parts[title]
+                drawing = next((rel for rel in part['rels'] if rel.Type.endswith("/drawing")), None)
+                writer = _PatchWorksheetWriter(ws, drawing and f"/{drawing.target}")
+                writer.write()
+                target.write(writer.out, part['path'])
+                writer.cleanup()
+
+                if drawing is None and ws._images:
+                    # Images added to a sheet that had no drawing in the template get a new drawing part
+                    new_drawing = SpreadsheetDrawing()
+                    new_drawing.images = ws._images
+                    new_drawing._id, next_drawing = next_drawing, next_drawing + 1
+                    for image in ws._images:
+                        image._id, next_image = next_image, next_image + 1
+                        target.writestr(image.path[1:], image._data())
+                        if image.format not in [default.Extension for default in manifest.Default]:
+                            manifest.Default.append(FileExtension(image.format, f"image/{image.format}"))
+                    target.writestr(new_drawing.path[1:], tostring(new_drawing._write()))
+                    target.writestr(get_rels_path(new_drawing.path)[1:], tostring(new_drawing._write_rels()))
+                    manifest.Override.append(Override(PartName=new_drawing.path, ContentType=new_drawing.mime_type))
+                    for rel in writer._rels.Relationship:
+                        if rel.Type.endswith("/drawing"):
+                            rel.Target = new_drawing.path
+                if writer._rels:
+                    target.writestr(part['rels_path'], tostring(writer._rels.to_tree()))
+
+            target.writestr(ARC_STYLE, tostring(write_stylesheet(workbook)))
+            workbook.properties.modified = datetime.utcnow()
+            target.writestr(ARC_CORE, tostring(workbook.properties.to_tree()))
+            target.writestr(ARC_CONTENT_TYPES, tostring(manifest.to_tree()))
+    logger.info(f"Patched {len(modified_sheets)} sheet(s) into a copy of '{os.path.basename(template_path)}'.")